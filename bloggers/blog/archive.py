@@ -0,0 +1,186 @@
+"""
+Archival of old blogs, with their comments and likes, out of the hot tables.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q
+from django.utils import timezone
+from blog import stats
+from blog.models import (
+    ArchivedBlog,
+    ArchivedComment,
+    ArchivedLike,
+    Blog,
+    BlogArchival,
+    BlogPurge,
+    Comment,
+    Like,
+)
+
+COMMENT_COLUMNS = [
+    "id",
+    "text",
+    "blog_id",
+    "user_id",
+    "parent_id",
+    "path",
+    "depth",
+    "position",
+    "reply_count",
+    "created_at",
+]
+LIKE_COLUMNS = ["id", "blog_id", "user_id", "created_at"]
+
+
+def start_archival(blog):
+    """Hides the blog, so that it no longer receives likes and comments, and
+    creates its archived copy. Returns the BlogArchival tracking the move.
+
+    Comments are copied in path order, comments without a path need
+    rebuild_comment_threads first.
+    """
+
+    if Comment.objects.filter(blog=blog, path="").exists():
+        raise ValueError(
+            f"Blog {blog.pk} has comments without a path, "
+            "run `python manage.py rebuild_comment_threads` first."
+        )
+    with transaction.atomic():
+        Blog.all_objects.filter(pk=blog.pk).update(deleted_at=timezone.now())
+        ArchivedBlog.objects.create(
+            id=blog.id,
+            title=blog.title,
+            desc=blog.desc,
+            created_at=blog.created_at,
+            author_id=blog.author_id,
+            thread_count=blog.thread_count,
+        )
+        return BlogArchival.objects.create(blog=blog)
+
+
+def archive_batch(archival, batch_size):
+    """Copies up to batch_size likes, then comments, of the blog to the archive
+    tables in one short transaction, keeping their ids. Once everything is
+    copied the hot rows are purged a batch at a time. Returns False when the
+    blog has left the hot tables."""
+
+    if archival.copied:
+        return BlogPurge.objects.get(blog_id=archival.blog_id).purge_batch(batch_size)
+
+    # Read through the (blog, user) index, which orders the likes of a blog by
+    # user and id.
+    likes = list(
+        Like.objects.filter(
+            Q(user_id__gt=archival.last_like_user_id)
+            | Q(user_id=archival.last_like_user_id, pk__gt=archival.last_like_id),
+            blog_id=archival.blog_id,
+            user_id__gte=archival.last_like_user_id,
+        )
+        .order_by("user", "pk")
+        .values(*LIKE_COLUMNS)[:batch_size]
+    )
+    if likes:
+        _copy(
+            archival,
+            ArchivedLike,
+            likes,
+            last_like_user_id=likes[-1]["user_id"],
+            last_like_id=likes[-1]["id"],
+            likes_archived=F("likes_archived") + len(likes),
+        )
+        return True
+
+    # Read through the (blog, path) index, in path order the parent of a
+    # comment is copied before the comment.
+    comments = list(
+        Comment.objects.filter(
+            blog_id=archival.blog_id, path__gt=archival.last_comment_path
+        )
+        .order_by("path")
+        .values(*COMMENT_COLUMNS)[:batch_size]
+    )
+    if comments:
+        _copy(
+            archival,
+            ArchivedComment,
+            comments,
+            last_comment_path=comments[-1]["path"],
+            comments_archived=F("comments_archived") + len(comments),
+        )
+        return True
+
+    with transaction.atomic():
+        BlogArchival.objects.filter(pk=archival.pk).update(
+            copied=True, updated_at=timezone.now()
+        )
+        BlogPurge.objects.create(blog_id=archival.blog_id)
+    archival.copied = True
+    return True
+
+
+def _copy(archival, archive_model, rows, **progress):
+    """Bulk creates the rows in the archive model and records the progress."""
+
+    with transaction.atomic():
+        archive_model.objects.bulk_create(archive_model(**row) for row in rows)
+        BlogArchival.objects.filter(pk=archival.pk).update(
+            **progress, updated_at=timezone.now()
+        )
+    archival.refresh_from_db()
+
+
+def archived_blog(blog_id):
+    """Returns the archived blog with its likes and comments loaded, or None.
+
+    While the blog is still being copied its hot rows are complete and the
+    archived ones are not, so the blog itself is returned instead.
+    """
+
+    copying = (
+        Blog.all_objects.with_likes_count()
+        .with_details()
+        .filter(pk=blog_id, archival__copied=False)
+        .first()
+    )
+    if copying is not None:
+        return copying
+    return (
+        ArchivedBlog.objects.filter(pk=blog_id)
+        .select_related("author")
+        .prefetch_related(
+            Prefetch("likes", queryset=ArchivedLike.objects.select_related("user")),
+            Prefetch(
+                "comments", queryset=ArchivedComment.objects.select_related("user")
+            ),
+        )
+        .annotate(likes_count=Count("likes"))
+        .first()
+    )
+
+
+def delete_archived_blog(blog_id):
+    """Deletes the archived blog with its comments and likes, and subtracts them
+    from the stats of its author. Returns False when there is no such blog.
+
+    A blog still being copied counts from its hot rows, its archival is dropped
+    and the blog is purged like any deleted blog instead.
+    """
+
+    with transaction.atomic():
+        archived = ArchivedBlog.objects.select_for_update().filter(pk=blog_id).first()
+        if archived is None:
+            return False
+        archival = (
+            BlogArchival.objects.select_for_update()
+            .filter(blog_id=blog_id, copied=False)
+            .select_related("blog")
+            .first()
+        )
+        if archival is None:
+            stats.remove_archived_blog(archived)
+        else:
+            stats.remove_blog(archival.blog)
+            archival.delete()
+            BlogPurge.objects.create(blog=archival.blog)
+        archived.delete()
+    return True
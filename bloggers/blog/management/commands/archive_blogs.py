@@ -0,0 +1,57 @@
+"""
+Move blogs older than BLOG_ARCHIVE_AFTER_DAYS to the archive tables.
+"""
+
+import datetime
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from blog.archive import archive_batch, start_archival
+from blog.models import Blog, BlogArchival
+
+
+class Command(BaseCommand):
+    """Keep the blog, comment and like tables small by archiving old blogs"""
+
+    help = "Move old blogs with their comments and likes to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.BLOG_ARCHIVE_AFTER_DAYS,
+            help="archive blogs created more than this many days ago",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0, help="seconds to sleep between batches"
+        )
+
+    def handle(self, *args, **options):
+        # Archivals interrupted by an earlier run are finished first.
+        for archival in BlogArchival.objects.order_by("pk"):
+            self._archive(archival, options["batch_size"], options["pause"])
+
+        cutoff = timezone.now() - datetime.timedelta(days=options["older_than_days"])
+        # Read through the created_at index, oldest first, a chunk at a time as
+        # archived blogs leave the table.
+        old_blogs = Blog.objects.filter(created_at__lt=cutoff).order_by("created_at")
+        archived = 0
+        while blogs := list(old_blogs[: options["batch_size"]]):
+            for blog in blogs:
+                try:
+                    archival = start_archival(blog)
+                except ValueError as exc:
+                    raise CommandError(str(exc)) from exc
+                self._archive(archival, options["batch_size"], options["pause"])
+                archived += 1
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} blogs."))
+
+    def _archive(self, archival, batch_size, pause):
+        while archive_batch(archival, batch_size):
+            time.sleep(pause)
+        self.stdout.write(
+            f"Blog {archival.blog_id}: archived with {archival.comments_archived} "
+            f"comments, {archival.likes_archived} likes"
+        )
@@ -0,0 +1,193 @@
+"""
+Benchmark how many idle event streams a single ASGI worker holds.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+from blog.models import Blog, Like
+from user.models import User
+
+TIMEOUT = 60
+
+
+class Command(BaseCommand):
+    """Measure the memory of idle streams and the fan-out of one like in a
+    gunicorn uvicorn worker"""
+
+    help = (
+        "Start one uvicorn worker, hold idle event streams open against it and "
+        "measure its memory per stream and the fan-out latency of a like."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=5000)
+        parser.add_argument(
+            "--blog", type=int, required=True, help="Id of the streamed blog."
+        )
+        parser.add_argument(
+            "--username",
+            required=True,
+            help="User opening the streams and liking the blog, not liking it yet.",
+        )
+        parser.add_argument("--bind", default="127.0.0.1:8001")
+
+    def handle(self, *args, **options):
+        subscribers = options["subscribers"]
+        user = User.objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"No user named {options['username']}.")
+        blog = Blog.objects.filter(pk=options["blog"]).first()
+        if blog is None:
+            raise CommandError(f"No blog {options['blog']}.")
+        if Like.objects.filter(blog=blog, user=user).exists():
+            raise CommandError(f"{user.username} already likes blog {blog.pk}.")
+
+        host, port = options["bind"].rsplit(":", 1)
+        env = dict(
+            os.environ,
+            GUNICORN_WORKER_CLASS="uvicorn_worker.UvicornWorker",
+            GUNICORN_WORKERS="1",
+            GUNICORN_BIND=options["bind"],
+            EVENT_STREAM_MAX_CONNECTIONS=str(subscribers),
+            EVENT_STREAM_MAX_USER_CONNECTIONS=str(subscribers),
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn"], cwd=settings.BASE_DIR, env=env
+        )
+        client = Client(host, int(port), str(AccessToken.for_user(user)))
+        try:
+            memory, fan_out = asyncio.run(
+                self.run(client, server.pid, subscribers, blog.pk)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+        self.stdout.write(
+            f"{subscribers} idle streams: {memory / 2**20:.1f} MiB, "
+            f"{memory / subscribers / 1024:.2f} KiB per stream"
+        )
+        self.stdout.write(
+            f"like to {subscribers} streams: {fan_out * 1000:.1f} ms, "
+            f"{fan_out / subscribers * 1e6:.2f} us per stream"
+        )
+
+    async def run(self, client, master, subscribers, blog_id):
+        await client.wait_until_ready(reverse("blog:blog", kwargs={"id": blog_id}))
+        worker = worker_pid(master)
+        before = rss(worker)
+
+        path = reverse("blog:events", kwargs={"id": blog_id})
+        streams = []
+        # Opened in batches, a burst of thousands of connects overflows the
+        # listen backlog.
+        for batch in range(0, subscribers, 100):
+            streams += await asyncio.gather(
+                *(
+                    client.open_stream(path)
+                    for _ in range(min(100, subscribers - batch))
+                )
+            )
+        memory = rss(worker) - before
+
+        start = time.perf_counter()
+        await client.request("POST", reverse("blog:like", kwargs={"id": blog_id}))
+        await asyncio.wait_for(
+            asyncio.gather(
+                *(read_until(reader, b"event: like") for reader, _ in streams)
+            ),
+            TIMEOUT,
+        )
+        fan_out = time.perf_counter() - start
+
+        for _, writer in streams:
+            writer.close()
+        await client.request("DELETE", reverse("blog:unlike", kwargs={"id": blog_id}))
+        return memory, fan_out
+
+
+class Client:
+    """Minimal HTTP/1.1 client, so that each stream is a real connection"""
+
+    def __init__(self, host, port, token):
+        self.host = host
+        self.port = port
+        self.token = token
+
+    def head(self, method, path):
+        return (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            f"Authorization: Bearer {self.token}\r\n"
+            "Content-Length: 0\r\n\r\n"
+        ).encode()
+
+    async def wait_until_ready(self, path):
+        """Waits until the worker has warmed up and answers a request."""
+
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            try:
+                return await self.request("GET", path)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError("The server did not start.")
+                await asyncio.sleep(0.1)
+
+    async def open_stream(self, path):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(self.head("GET", path))
+        status = await reader.readline()
+        if b" 200 " not in status:
+            raise CommandError(f"The stream was refused: {status.decode().strip()}")
+        await read_until(reader, b"retry:")
+        return reader, writer
+
+    async def request(self, method, path):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(self.head(method, path))
+        status = await reader.readline()
+        writer.close()
+        if b" 2" not in status:
+            raise CommandError(f"{method} {path} failed: {status.decode().strip()}")
+
+
+async def read_until(reader, marker):
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise CommandError("The server closed an event stream.")
+        if marker in line:
+            return
+
+
+def worker_pid(master):
+    """Returns the pid of the single worker forked by the gunicorn master."""
+
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        for stat in Path("/proc").glob("[0-9]*/stat"):
+            try:
+                fields = stat.read_text().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == master:
+                return int(stat.parent.name)
+        time.sleep(0.1)
+    raise CommandError("The gunicorn worker did not start.")
+
+
+def rss(pid):
+    """Returns the resident memory of the process in bytes."""
+
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
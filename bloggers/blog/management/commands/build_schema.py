@@ -0,0 +1,16 @@
+"""
+Generate the OpenAPI schema served by /api/schema.
+"""
+
+from django.core.management.base import BaseCommand
+from bloggers.schema import build_schema
+
+
+class Command(BaseCommand):
+    """Write the versioned schema files"""
+
+    help = "Generate the versioned OpenAPI schema files served by /api/schema."
+
+    def handle(self, *args, **options):
+        for path in build_schema():
+            self.stdout.write(f"Wrote {path}")
@@ -0,0 +1,40 @@
+"""
+Run EXPLAIN on the API view querysets and flag full scans and filesorts.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from bloggers.query_plans import check_query_plans
+from user.models import User
+from blog.models import Blog
+
+
+class Command(BaseCommand):
+    """Verify the index coverage of the API views"""
+
+    help = "Run EXPLAIN on each view queryset and flag full scans and filesorts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="username to build the querysets for")
+        parser.add_argument(
+            "--blog", type=int, help="blog id to build the querysets for"
+        )
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            user = User.objects.get(username=options["user"])
+        else:
+            user = User(pk=0, username="")
+        blog_id = options["blog"]
+        if blog_id is None:
+            blog_id = Blog.objects.values_list("id", flat=True).first() or 0
+
+        report = check_query_plans(user, blog_id)
+        for name, problems in report.items():
+            self.stdout.write(f"{name}: {', '.join(problems)}")
+        if report:
+            raise CommandError(
+                f"{len(report)} queryset(s) are not covered by an index."
+            )
+        self.stdout.write(
+            self.style.SUCCESS("All view querysets are covered by indexes.")
+        )
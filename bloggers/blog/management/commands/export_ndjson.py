@@ -0,0 +1,24 @@
+"""
+Export users, follows, blogs, comments and likes as an NDJSON stream.
+"""
+
+from django.core.management.base import BaseCommand
+from bloggers.ndjson import export_ndjson
+
+
+class Command(BaseCommand):
+    """Stream every record as one JSON object per line"""
+
+    help = "Export users, follows, blogs, comments and likes as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="file to write to, defaults to stdout")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["output"]:
+            with open(options["output"], "w") as stream:
+                count = export_ndjson(stream, options["chunk_size"])
+        else:
+            count = export_ndjson(self.stdout, options["chunk_size"])
+        self.stderr.write(f"Exported {count} records.")
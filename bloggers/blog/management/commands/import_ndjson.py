@@ -0,0 +1,36 @@
+"""
+Import users, follows, blogs, comments and likes from an NDJSON stream.
+"""
+
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from bloggers.ndjson import RecordError, import_ndjson
+
+
+class Command(BaseCommand):
+    """Bulk create records from one JSON object per line"""
+
+    help = "Import users, follows, blogs, comments and likes from NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="file to read from, - for stdin")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint", help="file recording progress, used to resume imports"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options["input"] == "-":
+                count = self._import(sys.stdin, options)
+            else:
+                with open(options["input"]) as stream:
+                    count = self._import(stream, options)
+        except RecordError as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write(self.style.SUCCESS(f"Imported {count} records."))
+
+    def _import(self, stream, options):
+        return import_ndjson(
+            stream, batch_size=options["batch_size"], checkpoint=options["checkpoint"]
+        )
@@ -0,0 +1,41 @@
+"""
+Purge the likes and comments of deleted blogs in bounded batches.
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from blog.models import BlogPurge
+
+
+class Command(BaseCommand):
+    """Delete the rows of soft deleted blogs without long running transactions"""
+
+    help = "Purge the likes, comments and rows of soft deleted blogs in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0, help="seconds to sleep between batches"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="keep running, checking for new deletions every given seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for purge in BlogPurge.objects.order_by("pk"):
+                self._purge(purge, options["batch_size"], options["pause"])
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
+
+    def _purge(self, purge, batch_size, pause):
+        while purge.purge_batch(batch_size):
+            self.stdout.write(
+                f"Blog {purge.blog_id}: {purge.likes_deleted} likes, "
+                f"{purge.comments_deleted} comments deleted"
+            )
+            time.sleep(pause)
+        self.stdout.write(self.style.SUCCESS(f"Blog {purge.blog_id}: purged"))
@@ -0,0 +1,64 @@
+"""
+Recompute the paths, depths, positions and reply counts of comment threads.
+"""
+
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.models import Blog, Comment, path_segment
+
+
+class Command(BaseCommand):
+    """Rebuild the materialized paths of comments, e.g. for comments created
+    before replies existed"""
+
+    help = "Recompute the paths, depths, positions and reply counts of comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--blog", type=int, help="only rebuild the given blog")
+
+    def handle(self, *args, **options):
+        blogs = Blog.all_objects.order_by("pk")
+        if options["blog"] is not None:
+            blogs = blogs.filter(pk=options["blog"])
+        for blog_id in blogs.values_list("pk", flat=True).iterator():
+            with transaction.atomic():
+                count = self.rebuild(blog_id, options["batch_size"])
+            self.stdout.write(f"Blog {blog_id}: {count} comments")
+
+    def rebuild(self, blog_id, batch_size):
+        # Replies always have a larger id than their parent, so in id order the
+        # parent of a comment has been placed before the comment itself.
+        paths = {}
+        depths = {}
+        reply_counts = defaultdict(int)
+        batch = []
+        comments = (
+            Comment.objects.filter(blog_id=blog_id)
+            .order_by("pk")
+            .only("pk", "parent_id")
+        )
+        for comment in comments.iterator(chunk_size=batch_size):
+            parent = comment.parent_id
+            reply_counts[parent] += 1
+            comment.position = reply_counts[parent]
+            comment.depth = 0 if parent is None else depths[parent] + 1
+            comment.path = paths.get(parent, "") + path_segment(comment.pk)
+            paths[comment.pk] = comment.path
+            depths[comment.pk] = comment.depth
+            batch.append(comment)
+            if len(batch) >= batch_size:
+                Comment.objects.bulk_update(batch, ["path", "depth", "position"])
+                batch = []
+        Comment.objects.bulk_update(batch, ["path", "depth", "position"])
+
+        Comment.objects.filter(blog_id=blog_id).update(reply_count=0)
+        replied = [
+            Comment(pk=pk, reply_count=count)
+            for pk, count in reply_counts.items()
+            if pk is not None
+        ]
+        Comment.objects.bulk_update(replied, ["reply_count"], batch_size=batch_size)
+        Blog.all_objects.filter(pk=blog_id).update(thread_count=reply_counts[None])
+        return len(paths)
@@ -0,0 +1,30 @@
+"""
+Recompute the daily engagement rollups from likes, comments and follows.
+"""
+
+import datetime
+from django.core.management.base import BaseCommand
+from blog.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    """Rebuild the author and blog rollups, e.g. after an import"""
+
+    help = "Recompute the daily likes, comments and followers of authors and blogs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="number of authors rebuilt per transaction",
+        )
+        parser.add_argument(
+            "--since",
+            type=datetime.date.fromisoformat,
+            help="only rebuild the days from this YYYY-MM-DD date on",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_stats(since=options["since"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} rollup rows."))
@@ -2,9 +2,73 @@
 Models for the blog API.
 """
 
+from django.db import models, transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from user.models import User, Follow
 
-from django.db import models
-from user.models import User
+
+class BlogQuerySet(models.QuerySet):
+    """QuerySet for blogs"""
+
+    def with_likes_count(self):
+        """Annotate likes_count with a correlated subquery instead of a join and
+        GROUP BY, so that ordering can be served from the created_at indexes."""
+
+        likes = (
+            Like.objects.filter(blog=OuterRef("pk"))
+            .order_by()
+            .values("blog")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return self.annotate(likes_count=Coalesce(Subquery(likes), 0))
+
+    def with_viewer_state(self, user):
+        """Annotate liked_by_me and following_author for the given user with
+        correlated EXISTS lookups, answered from the like and follow indexes."""
+
+        if not user.is_authenticated:
+            return self.annotate(
+                liked_by_me=Value(False), following_author=Value(False)
+            )
+        return self.annotate(
+            liked_by_me=Exists(Like.objects.filter(blog=OuterRef("pk"), user=user)),
+            following_author=Exists(
+                Follow.objects.filter(follower=user, following=OuterRef("author"))
+            ),
+        )
+
+    def with_details(self, likes=True):
+        """Load the author and the users of likes and comments in bulk, as they
+        are serialized by username."""
+
+        lookups = [
+            Prefetch("comments", queryset=Comment.objects.select_related("user"))
+        ]
+        if likes:
+            lookups.append(
+                Prefetch("likes", queryset=Like.objects.select_related("user"))
+            )
+        return self.select_related("author").prefetch_related(*lookups)
+
+
+class BlogManager(models.Manager.from_queryset(BlogQuerySet)):
+    """Manager for blogs that are not deleted"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Blog(models.Model):
@@ -13,23 +77,291 @@ class Blog(models.Model):
     title = models.CharField(max_length=255)
     desc = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed as the leading column of the (author, created_at, id) index.
+    author = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    thread_count = models.PositiveIntegerField(default=0)
+
+    objects = BlogManager()
+    all_objects = BlogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["author", "created_at", "id"])]
+
+    def soft_delete(self):
+        """Hide the blog and queue its likes and comments for purging"""
+
+        with transaction.atomic():
+            self.deleted_at = timezone.now()
+            self.save(update_fields=["deleted_at"])
+            BlogPurge.objects.create(blog=self)
+
+
+# Paths are the zero padded ids of the ancestors and of the comment, each
+# followed by PATH_SEPARATOR. PATH_END sorts after every path character, so
+# the descendants of a comment lie between its path and its path + PATH_END.
+PATH_WIDTH = 10
+PATH_SEPARATOR = "/"
+PATH_END = ":"
+
+
+def path_segment(pk):
+    """Returns the part of a comment path identifying the comment itself."""
+
+    return f"{pk:0{PATH_WIDTH}d}{PATH_SEPARATOR}"
+
+
+class CommentQuerySet(models.QuerySet):
+    """QuerySet for comments"""
+
+    def thread(self, blog_id, root=None, offset=0, limit=20, depth=3):
+        """Returns a page of the replies to root, or of the top level comments of
+        the blog, each with up to limit of its own replies set on thread_replies,
+        down to depth levels.
+
+        Replies of a comment share the path of the comment as prefix, so the
+        page and its descendants are read with one range query on the
+        (blog, path) index, in thread order. The per level limit is applied in
+        SQL: a reply is only read when it and each of its ancestors below the
+        page are among the first limit replies of their parent, checked by
+        primary key joins to the ancestors. Only the top level is offset,
+        deeper levels hold their first replies and reply_count tells how many
+        more can be fetched with a query rooted at that comment."""
+
+        top = 0 if root is None else root.depth + 1
+        bounds = self.filter(
+            blog_id=blog_id,
+            parent=root,
+            position__gt=offset,
+            position__lte=offset + limit,
+        ).aggregate(first=Min("path"), last=Max("path"))
+        if bounds["first"] is None:
+            return []
+
+        levels = models.Q(depth=top)
+        for level in range(1, depth):
+            within_limit = models.Q(depth=top + level)
+            for ancestor in range(level):
+                within_limit &= models.Q(
+                    **{"parent__" * ancestor + "position__lte": limit}
+                )
+            levels |= within_limit
+        comments = (
+            self.filter(
+                blog_id=blog_id,
+                path__gte=bounds["first"],
+                path__lt=bounds["last"] + PATH_END,
+                depth__lt=top + depth,
+            )
+            .filter(levels)
+            .select_related("user")
+            .order_by("path")
+        )
+        nodes = {}
+        page = []
+        for comment in comments:
+            comment.thread_replies = []
+            if comment.depth == top:
+                page.append(comment)
+            else:
+                nodes[comment.parent_id].thread_replies.append(comment)
+            nodes[comment.pk] = comment
+        return page
 
 
 class Comment(models.Model):
     """Comment object"""
 
+    MAX_DEPTH = 20
+
     text = models.TextField()
+    # Indexed as the leading column of the composite indexes below.
     blog = models.ForeignKey(
-        Blog, on_delete=models.CASCADE, related_name="comments", db_index=True
+        Blog, on_delete=models.CASCADE, related_name="comments", db_index=False
     )
     user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=True)
+    parent = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.CASCADE, related_name="replies"
+    )
+    path = models.CharField(max_length=255, default="", editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    position = models.PositiveIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["blog", "user"]),
+            models.Index(fields=["blog", "path"]),
+            models.Index(fields=["blog", "parent", "position"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Place a new comment in its thread: count it as a reply of its parent,
+        or as a thread of its blog, and store its path once its id is known."""
+
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            if self.parent_id is None:
+                counter = Blog.all_objects.filter(pk=self.blog_id)
+                field = "thread_count"
+                self.depth = 0
+                prefix = ""
+            else:
+                counter = Comment.objects.filter(pk=self.parent_id)
+                field = "reply_count"
+                self.depth = self.parent.depth + 1
+                prefix = self.parent.path
+            counter.update(**{field: F(field) + 1})
+            self.position = counter.values_list(field, flat=True).get()
+            super().save(*args, **kwargs)
+            self.path = prefix + path_segment(self.pk)
+            super().save(update_fields=["path"])
 
 
 class Like(models.Model):
     """Like object"""
 
+    # Indexed as the leading column of the (blog, user) index.
     blog = models.ForeignKey(
-        Blog, on_delete=models.CASCADE, related_name="likes", db_index=True
+        Blog, on_delete=models.CASCADE, related_name="likes", db_index=False
     )
     user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["blog", "user"])]
+
+
+class BlogPurge(models.Model):
+    """Purge of a deleted blog, tracking the rows deleted so far"""
+
+    blog = models.OneToOneField(Blog, on_delete=models.CASCADE, related_name="purge")
+    likes_deleted = models.PositiveBigIntegerField(default=0)
+    comments_deleted = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def purge_batch(self, batch_size):
+        """Delete up to batch_size likes, then comments, of the blog in one short
+        transaction. Deletes the blog itself once nothing refers to it anymore.
+        Returns False when the purge is complete."""
+
+        for model, counter in ((Like, "likes_deleted"), (Comment, "comments_deleted")):
+            # Comments are taken in reverse path order, so replies go first and
+            # deleting a batch never cascades to rows outside of it.
+            queryset = model.objects.filter(blog_id=self.blog_id)
+            if model is Comment:
+                queryset = queryset.order_by("-path")
+            pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+            if pks:
+                with transaction.atomic():
+                    deleted, _ = model.objects.filter(pk__in=pks).delete()
+                    setattr(self, counter, getattr(self, counter) + deleted)
+                    BlogPurge.objects.filter(pk=self.pk).update(
+                        **{counter: F(counter) + deleted, "updated_at": timezone.now()}
+                    )
+                return True
+
+        Blog.all_objects.filter(pk=self.blog_id).delete()
+        return False
+
+
+class BlogArchival(models.Model):
+    """Move of an old blog to the archive tables, tracking the rows copied so far.
+
+    The blog is hidden while its likes, in (user, id) order, then comments, in
+    path order, are copied a batch per transaction. Once everything is copied the hot rows are handed
+    over to a BlogPurge, deleting the blog cascades to the archival."""
+
+    blog = models.OneToOneField(Blog, on_delete=models.CASCADE, related_name="archival")
+    last_like_user_id = models.BigIntegerField(default=0)
+    last_like_id = models.BigIntegerField(default=0)
+    last_comment_path = models.CharField(max_length=255, default="")
+    likes_archived = models.PositiveBigIntegerField(default=0)
+    comments_archived = models.PositiveBigIntegerField(default=0)
+    copied = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class AuthorDailyStats(models.Model):
+    """New likes and comments on the blogs of an author, and new followers of
+    the author, in a day"""
+
+    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+    followers = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["author", "day"], name="author_daily_stats_unique"
+            )
+        ]
+
+
+class BlogDailyStats(models.Model):
+    """New likes and comments on a blog in a day"""
+
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE)
+    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["blog", "day"], name="blog_daily_stats_unique"
+            )
+        ]
+        indexes = [models.Index(fields=["author", "day", "blog"])]
+
+
+class ArchivedBlog(models.Model):
+    """Blog moved out of the hot tables by archive_blogs, keeping its id"""
+
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    desc = models.TextField()
+    created_at = models.DateTimeField(db_index=True)
+    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    thread_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+
+class ArchivedComment(models.Model):
+    """Comment of an archived blog"""
+
+    id = models.BigIntegerField(primary_key=True)
+    text = models.TextField()
+    blog = models.ForeignKey(
+        ArchivedBlog, on_delete=models.CASCADE, related_name="comments"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    parent = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.CASCADE, related_name="replies"
+    )
+    path = models.CharField(max_length=255, default="")
+    depth = models.PositiveSmallIntegerField(default=0)
+    position = models.PositiveIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+
+
+class ArchivedLike(models.Model):
+    """Like of an archived blog"""
+
+    id = models.BigIntegerField(primary_key=True)
+    blog = models.ForeignKey(
+        ArchivedBlog, on_delete=models.CASCADE, related_name="likes"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
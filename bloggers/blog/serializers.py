@@ -2,7 +2,7 @@
 Serializers for the blog API.
 """
 
-
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from blog.models import Blog, Comment, Like
 
@@ -19,6 +19,8 @@ class LikeSerializer(serializers.ModelSerializer):
 class LikeDetailsSerializer(LikeSerializer):
     """Serializer for like with additional details"""
 
+    user = serializers.SlugRelatedField(slug_field="username", read_only=True)
+
     class Meta(LikeSerializer.Meta):
         fields = LikeSerializer.Meta.fields + ["user"]
 
@@ -28,17 +30,52 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ["id", "text"]
-        read_only_fields = ["id"]
+        fields = ["id", "text", "parent", "reply_count"]
+        read_only_fields = ["id", "reply_count"]
+
+    def validate_parent(self, parent):
+        if parent is not None and parent.depth >= Comment.MAX_DEPTH:
+            raise serializers.ValidationError(
+                f"Replies can be nested {Comment.MAX_DEPTH} levels deep at most."
+            )
+        return parent
 
 
 class CommentDetailsSerializer(CommentSerializer):
     """Serializer for comment with additional details"""
 
+    user = serializers.SlugRelatedField(slug_field="username", read_only=True)
+
     class Meta(CommentSerializer.Meta):
         fields = CommentSerializer.Meta.fields + ["user"]
 
 
+class CommentThreadSerializer(CommentDetailsSerializer):
+    """Serializer for comment with a page of its replies"""
+
+    replies = serializers.SerializerMethodField()
+
+    class Meta(CommentDetailsSerializer.Meta):
+        fields = CommentDetailsSerializer.Meta.fields + ["depth", "replies"]
+
+    def get_replies(self, comment):
+        return CommentThreadSerializer(comment.thread_replies, many=True).data
+
+
+# Replies are threads themselves, the field is documented once the class exists.
+extend_schema_field(CommentThreadSerializer(many=True))(
+    CommentThreadSerializer.get_replies
+)
+
+
+class CommentThreadQuerySerializer(serializers.Serializer):
+    """Serializer for the pagination parameters of comment threads"""
+
+    offset = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    depth = serializers.IntegerField(min_value=1, max_value=5, default=3)
+
+
 class BlogSerializer(serializers.ModelSerializer):
     """Serializer for the blog object"""
 
@@ -51,6 +88,7 @@ class BlogSerializer(serializers.ModelSerializer):
 class BlogWithCommentsSerializer(BlogSerializer):
     """Serializer for the blog with additional details"""
 
+    author = serializers.SlugRelatedField(slug_field="username", read_only=True)
     likes = LikeDetailsSerializer(many=True)
     comments = CommentDetailsSerializer(many=True)
     likes_count = serializers.IntegerField()
@@ -60,5 +98,26 @@ class BlogWithCommentsSerializer(BlogSerializer):
             "author",
             "likes",
             "likes_count",
+            "thread_count",
+            "comments",
+        ]
+
+
+class BlogListSerializer(BlogSerializer):
+    """Serializer for the blogs of listings, with the state of the viewer"""
+
+    author = serializers.SlugRelatedField(slug_field="username", read_only=True)
+    comments = CommentDetailsSerializer(many=True)
+    likes_count = serializers.IntegerField()
+    liked_by_me = serializers.BooleanField()
+    following_author = serializers.BooleanField()
+
+    class Meta(BlogSerializer.Meta):
+        fields = BlogSerializer.Meta.fields + [
+            "author",
+            "likes_count",
+            "liked_by_me",
+            "following_author",
+            "thread_count",
             "comments",
         ]
@@ -0,0 +1,214 @@
+"""
+Daily engagement rollups of authors and blogs.
+
+Rows are counted on the day they were created, a deleted like, comment or
+follow is subtracted from that day again. The rollups therefore always equal
+what rebuild_stats computes from the rows themselves.
+"""
+
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from blog.models import (
+    ArchivedComment,
+    ArchivedLike,
+    AuthorDailyStats,
+    BlogArchival,
+    BlogDailyStats,
+    Comment,
+    Like,
+)
+from user.models import Follow, User
+
+
+def _increment(model, lookup, **deltas):
+    """Adds the deltas to the rollup row matching lookup, creating it if needed."""
+
+    updates = {name: F(name) + delta for name, delta in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Created by a concurrent request since the update above.
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _record(blog, created_at, **deltas):
+    day = timezone.localdate(created_at)
+    _increment(
+        BlogDailyStats,
+        {"blog_id": blog.id, "author_id": blog.author_id, "day": day},
+        **deltas,
+    )
+    _increment(AuthorDailyStats, {"author_id": blog.author_id, "day": day}, **deltas)
+
+
+def record_like(blog, like, delta=1):
+    """Counts a new like, or with delta=-1 a deleted one, of the blog."""
+
+    _record(blog, like.created_at, likes=delta)
+
+
+def record_comment(blog, comment, delta=1):
+    """Counts a new comment, or with delta=-1 a deleted one, of the blog."""
+
+    _record(blog, comment.created_at, comments=delta)
+
+
+def record_follow(follow, delta=1):
+    """Counts a new follower, or with delta=-1 a lost one, of the followed user."""
+
+    day = timezone.localdate(follow.created_at)
+    _increment(
+        AuthorDailyStats,
+        {"author_id": follow.following_id, "day": day},
+        followers=delta,
+    )
+
+
+def remove_blog(blog):
+    """Subtracts the likes and comments of a deleted blog from its author."""
+
+    rows = BlogDailyStats.objects.filter(blog=blog)
+    for day, likes, comments in rows.values_list("day", "likes", "comments"):
+        _increment(
+            AuthorDailyStats,
+            {"author_id": blog.author_id, "day": day},
+            likes=-likes,
+            comments=-comments,
+        )
+    rows.delete()
+
+
+def remove_archived_blog(blog):
+    """Subtracts the archived likes and comments of a deleted archived blog from
+    its author."""
+
+    for model, field in ((ArchivedLike, "likes"), (ArchivedComment, "comments")):
+        for day, count in (
+            model.objects.filter(blog=blog)
+            .annotate(day=TruncDate("created_at"))
+            .values("day")
+            .annotate(count=Count("id"))
+            .order_by()
+            .values_list("day", "count")
+        ):
+            _increment(
+                AuthorDailyStats,
+                {"author_id": blog.author_id, "day": day},
+                **{field: -count},
+            )
+
+
+def rebuild_stats(since=None, batch_size=1000):
+    """Recomputes the rollups of every day, or of the days from since on, from
+    the likes, comments and follows. Returns the number of rows written.
+
+    Authors are rebuilt batch_size at a time, each batch in its own
+    transaction, which bounds both the memory used and how long the rollup
+    rows are locked.
+    """
+
+    count = 0
+    authors = User.objects.order_by("pk").values_list("pk", flat=True)
+    last_pk = None
+    while True:
+        chunk = authors if last_pk is None else authors.filter(pk__gt=last_pk)
+        pks = list(chunk[:batch_size])
+        if not pks:
+            return count
+        count += _rebuild_authors(pks, since, batch_size)
+        last_pk = pks[-1]
+
+
+def _since(queryset, since):
+    if since is None:
+        return queryset
+    return queryset.filter(created_at__date__gte=since)
+
+
+def _rebuild_authors(pks, since, batch_size):
+    """Recomputes the rollups of the given authors in a single transaction.
+
+    The rollup rows are locked before the rows are counted, so that a like,
+    comment or follow recorded meanwhile waits for the rebuild and is added on
+    top of it instead of being overwritten.
+    """
+
+    blog_rows = BlogDailyStats.objects.filter(author__in=pks)
+    author_rows = AuthorDailyStats.objects.filter(author__in=pks)
+    if since is not None:
+        blog_rows = blog_rows.filter(day__gte=since)
+        author_rows = author_rows.filter(day__gte=since)
+    with transaction.atomic():
+        # In the order _record increments them.
+        list(blog_rows.select_for_update().values_list("pk", flat=True))
+        list(author_rows.select_for_update().values_list("pk", flat=True))
+
+        blogs = defaultdict(lambda: {"likes": 0, "comments": 0})
+        for model, field in ((Like, "likes"), (Comment, "comments")):
+            # Blogs being copied to the archive still count from the hot tables.
+            queryset = model.objects.filter(
+                Q(blog__deleted_at__isnull=True) | Q(blog__archival__copied=False),
+                blog__author__in=pks,
+            )
+            for blog, author, day, count in (
+                _since(queryset, since)
+                .annotate(day=TruncDate("created_at"))
+                .values("blog", "blog__author", "day")
+                .annotate(count=Count("id"))
+                .order_by()
+                .values_list("blog", "blog__author", "day", "count")
+            ):
+                blogs[blog, author, day][field] = count
+
+        authors = defaultdict(lambda: {"likes": 0, "comments": 0, "followers": 0})
+        for (_, author, day), counts in blogs.items():
+            authors[author, day]["likes"] += counts["likes"]
+            authors[author, day]["comments"] += counts["comments"]
+        # Archived blogs keep counting for their author, they have no blog rollups.
+        for model, field in ((ArchivedLike, "likes"), (ArchivedComment, "comments")):
+            queryset = model.objects.filter(blog__author__in=pks).exclude(
+                blog__in=BlogArchival.objects.filter(copied=False).values("blog")
+            )
+            for author, day, count in (
+                _since(queryset, since)
+                .annotate(day=TruncDate("created_at"))
+                .values("blog__author", "day")
+                .annotate(count=Count("id"))
+                .order_by()
+                .values_list("blog__author", "day", "count")
+            ):
+                authors[author, day][field] += count
+        follows = Follow.objects.filter(following__in=pks)
+        for author, day, count in (
+            _since(follows, since)
+            .annotate(day=TruncDate("created_at"))
+            .values("following", "day")
+            .annotate(count=Count("id"))
+            .order_by()
+            .values_list("following", "day", "count")
+        ):
+            authors[author, day]["followers"] = count
+
+        blog_rows.delete()
+        author_rows.delete()
+        BlogDailyStats.objects.bulk_create(
+            [
+                BlogDailyStats(blog_id=blog, author_id=author, day=day, **counts)
+                for (blog, author, day), counts in blogs.items()
+            ],
+            batch_size=batch_size,
+        )
+        AuthorDailyStats.objects.bulk_create(
+            [
+                AuthorDailyStats(author_id=author, day=day, **counts)
+                for (author, day), counts in authors.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(blogs) + len(authors)
@@ -2,24 +2,54 @@
 Tests for the blog API
 """
 
-
-from django.test import TestCase
-from django.urls import reverse
+import asyncio
+import datetime
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.urls import get_resolver, reverse
+from django.utils import timezone
 from django.db.models import Count
 from rest_framework.test import APIClient
 from rest_framework import status
-from user.models import User
-from blog.models import Blog
-from blog.serializers import BlogWithCommentsSerializer
-
+from rest_framework_simplejwt.tokens import AccessToken
+from drf_spectacular.drainage import GENERATOR_STATS
+from user.models import User, Follow
+from blog.archive import archive_batch, start_archival
+from blog.models import (
+    ArchivedBlog,
+    ArchivedComment,
+    ArchivedLike,
+    AuthorDailyStats,
+    Blog,
+    BlogArchival,
+    BlogPurge,
+    Comment,
+    Like,
+)
+from blog.serializers import BlogListSerializer
+from bloggers.events import OVERFLOW, LocalBus, RedisBus, connections, get_bus
+from bloggers.query_plans import check_query_plans
+from bloggers.ndjson import RecordError, export_ndjson, import_ndjson
+from bloggers.schema import _schemas, build_schema
+from bloggers.warmup import warmup
 
 CREATE_BLOG_URL = reverse("blog:create-blog")
 BLOG_URL = lambda blog_id: reverse("blog:blog", kwargs={"id": blog_id})
 MY_BLOGS_URL = reverse("blog:my-blogs")
 ALL_BLOGS_URL = reverse("blog:all-blogs")
 COMMENT_URL = lambda blog_id: reverse("blog:comment", kwargs={"id": blog_id})
+COMMENTS_URL = lambda blog_id: reverse("blog:comments", kwargs={"id": blog_id})
+REPLIES_URL = lambda comment_id: reverse("blog:replies", kwargs={"id": comment_id})
 LIKE_URL = lambda blog_id: reverse("blog:like", kwargs={"id": blog_id})
 UNLIKE_URL = lambda blog_id: reverse("blog:unlike", kwargs={"id": blog_id})
+BLOG_EVENTS_URL = lambda blog_id: reverse("blog:events", kwargs={"id": blog_id})
+SCHEMA_URL = reverse("api-schema")
 
 
 def create_user(**fields):
@@ -120,6 +150,40 @@ class AuthorizedUserBlogTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(blog_count, 0)
 
+    def test_deleted_blog_hidden_until_purged(self):
+        """Test a deleted blog is hidden at once and purged in batches later."""
+
+        self.client.force_authenticate(user=self.user1)
+        payload = {"title": "Test Post 1", "desc": "This is a test post"}
+        new_blog = self.client.post(CREATE_BLOG_URL, payload)
+        blog_id = new_blog.data["id"]
+        self.client.post(LIKE_URL(blog_id))
+        comment = self.client.post(COMMENT_URL(blog_id), {"text": "Comment"})
+        for i in range(2):
+            reply_payload = {"text": f"Reply {i}", "parent": comment.data["id"]}
+            self.client.post(COMMENT_URL(blog_id), reply_payload)
+        res = self.client.delete(BLOG_URL(blog_id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.client.get(ALL_BLOGS_URL).data, [])
+        self.assertEqual(self.client.get(MY_BLOGS_URL).data, [])
+        res = self.client.get(BLOG_URL(blog_id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.post(LIKE_URL(blog_id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Comment.objects.filter(blog=blog_id).count(), 3)
+
+        purge = BlogPurge.objects.get(blog=blog_id)
+        self.assertTrue(purge.purge_batch(2))
+        self.assertTrue(purge.purge_batch(2))
+        purge.refresh_from_db()
+        self.assertEqual((purge.likes_deleted, purge.comments_deleted), (1, 2))
+
+        call_command("purge_deleted_blogs", batch_size=2, stdout=io.StringIO())
+        self.assertFalse(Blog.all_objects.filter(id=blog_id).exists())
+        self.assertFalse(Comment.objects.filter(blog=blog_id).exists())
+        self.assertFalse(BlogPurge.objects.exists())
+
     def test_comment_on_blog_with_given_id_successful(self):
         """Test comment on a blog with given id is successful."""
 
@@ -178,14 +242,18 @@ class AuthorizedUserBlogTests(TestCase):
         like = self.client.post(LIKE_URL(new_blog.data["id"]))
         res = self.client.get(MY_BLOGS_URL)
         blogs = (
-            Blog.objects.filter(author=self.user1.username)
+            Blog.objects.filter(author=self.user1)
             .all()
             .annotate(likes_count=Count("likes"))
+            .with_viewer_state(self.user1)
             .order_by("-created_at")
         )
-        serializer = BlogWithCommentsSerializer(blogs, many=True)
+        serializer = BlogListSerializer(blogs, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data[0]["author"], self.user1.username)
+        self.assertTrue(res.data[0]["liked_by_me"])
+        self.assertNotIn("likes", res.data[0])
 
     def test_retrieve_all_blogs_successful(self):
         """Test retrieving all the blogs is successful."""
@@ -200,8 +268,586 @@ class AuthorizedUserBlogTests(TestCase):
         blogs = (
             Blog.objects.all()
             .annotate(likes_count=Count("likes"))
+            .with_viewer_state(self.user1)
             .order_by("-created_at")
         )
-        serializer = BlogWithCommentsSerializer(blogs, many=True)
+        serializer = BlogListSerializer(blogs, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
+
+    def test_listing_flags_viewer_likes_and_follows(self):
+        """Test listings flag the blogs liked and the authors followed by the viewer."""
+
+        liked = Blog.objects.create(title="Liked", desc="Post", author=self.user1)
+        Blog.objects.create(title="Not liked", desc="Post", author=self.user2)
+        Like.objects.create(blog=liked, user=self.user2)
+        Follow.objects.create(follower=self.user2, following=self.user1)
+
+        self.client.force_authenticate(user=self.user2)
+        res = self.client.get(ALL_BLOGS_URL)
+        flags = {
+            blog["title"]: (blog["liked_by_me"], blog["following_author"])
+            for blog in res.data
+        }
+        self.assertEqual(flags, {"Liked": (True, True), "Not liked": (False, False)})
+
+        self.client.force_authenticate(user=None)
+        res = self.client.get(ALL_BLOGS_URL)
+        self.assertFalse(any(blog["liked_by_me"] for blog in res.data))
+
+
+class QueryPlanTests(TestCase):
+    """Tests for the index coverage of the view querysets."""
+
+    def test_view_querysets_have_no_full_scans_or_filesorts(self):
+        """Test EXPLAIN of every view queryset reports no full scans or filesorts."""
+
+        user = create_user(
+            email="user1@example.com", password="user1pass", name="User1"
+        )
+        blog = Blog.objects.create(
+            title="Test Post 1", desc="This is a test post", author=user
+        )
+        self.assertEqual(check_query_plans(user, blog.id), {})
+
+
+class NDJSONTests(TestCase):
+    """Tests for the NDJSON export and import."""
+
+    def setUp(self):
+        self.user1 = create_user(
+            email="user1@example.com", password="user1pass", name="User1"
+        )
+        self.user2 = create_user(
+            email="user2@example.com", password="user2pass", name="User2"
+        )
+        self.blog = Blog.objects.create(
+            title="Test Post 1", desc="This is a test post", author=self.user1
+        )
+        Comment.objects.create(text="Sample comment", blog=self.blog, user=self.user2)
+        Like.objects.create(blog=self.blog, user=self.user2)
+        Follow.objects.create(follower=self.user2, following=self.user1)
+
+    def export(self):
+        stream = io.StringIO()
+        export_ndjson(stream, chunk_size=1)
+        return stream.getvalue()
+
+    def test_export_import_round_trip(self):
+        """Test importing an export recreates every record."""
+
+        old_blog = Blog.objects.create(
+            title="Old Post", desc="This is an old post", author=self.user2
+        )
+        Comment.objects.create(text="Old comment", blog=old_blog, user=self.user1)
+        Like.objects.create(blog=old_blog, user=self.user1)
+        archival = start_archival(old_blog)
+        while archive_batch(archival, batch_size=1000):
+            pass
+        archived_at = ArchivedBlog.objects.get().archived_at
+
+        data = self.export()
+        created_at = self.blog.created_at
+        User.objects.all().delete()
+        self.assertEqual(import_ndjson(io.StringIO(data), batch_size=1), 9)
+        archived = ArchivedBlog.objects.get(id=old_blog.id)
+        self.assertEqual(archived.archived_at, archived_at)
+        self.assertEqual(archived.comments.get().user.username, self.user1.username)
+        self.assertEqual(archived.likes.get().user.username, self.user1.username)
+        blog = Blog.objects.get(id=self.blog.id)
+        self.assertEqual(blog.author.username, self.user1.username)
+        self.assertEqual(blog.created_at, created_at)
+        self.assertEqual(blog.comments.get().user.username, self.user2.username)
+        self.assertEqual(blog.likes.get().user.username, self.user2.username)
+        follows = Follow.objects.filter(follower__username=self.user2.username)
+        self.assertTrue(follows.exists())
+        user = User.objects.get(username=self.user1.username)
+        self.assertTrue(user.check_password("user1pass"))
+        self.assertEqual(self.export(), data)
+
+    def test_import_skips_existing_records(self):
+        """Test re-importing an export creates nothing and keeps existing rows."""
+
+        data = self.export()
+        comment = Comment.objects.get()
+        Comment.objects.filter(pk=comment.pk).update(
+            created_at=comment.created_at - datetime.timedelta(days=1)
+        )
+        self.assertEqual(import_ndjson(io.StringIO(data)), 0)
+        self.assertEqual(
+            Comment.objects.get().created_at,
+            comment.created_at - datetime.timedelta(days=1),
+        )
+
+    def test_import_rejects_unknown_blog(self):
+        """Test importing a like of a blog that does not exist fails."""
+
+        data = self.export()
+        lines = [line for line in data.splitlines() if '"blog.like"' in line]
+        Like.objects.all().delete()
+        Blog.all_objects.all().delete()
+        with self.assertRaises(RecordError):
+            import_ndjson(io.StringIO(lines[0]))
+        self.assertFalse(Like.objects.exists())
+
+    def test_export_skips_deleted_blogs(self):
+        """Test deleted blogs waiting to be purged are not exported."""
+
+        self.blog.soft_delete()
+        data = self.export()
+        self.assertNotIn('"blog.', data)
+
+    def test_export_blog_being_archived_from_hot_tables(self):
+        """Test a blog still being copied to the archive is exported whole."""
+
+        archive_batch(start_archival(self.blog), batch_size=1)
+        data = self.export()
+        self.assertIn('"blog.like"', data)
+        self.assertIn('"blog.comment"', data)
+        self.assertNotIn('"blog.archived', data)
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test an import skips the lines recorded in the checkpoint."""
+
+        data = self.export()
+        User.objects.all().delete()
+        fd, checkpoint = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, checkpoint)
+        lines = data.splitlines(keepends=True)
+        import_ndjson(io.StringIO("".join(lines[:3])), checkpoint=checkpoint)
+        with open(checkpoint) as f:
+            self.assertEqual(f.read(), "3")
+        self.assertEqual(import_ndjson(io.StringIO(data), checkpoint=checkpoint), 3)
+        self.assertEqual(Blog.objects.count(), 1)
+        self.assertEqual(Like.objects.count(), 1)
+        with open(checkpoint) as f:
+            self.assertEqual(f.read(), "6")
+
+
+class SchemaTests(TestCase):
+    """Tests for the precomputed OpenAPI schema."""
+
+    def setUp(self):
+        self.client = APIClient()
+        schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(schema_dir.cleanup)
+        self.settings_override = override_settings(OPENAPI_SCHEMA_DIR=schema_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_schema_served_with_etag(self):
+        """Test the built schema is served with an ETag and revalidated."""
+
+        yaml_path, json_path = build_schema()
+        res = self.client.get(SCHEMA_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, yaml_path.read_bytes())
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        res = self.client.get(SCHEMA_URL, {"format": "json"})
+        self.assertEqual(res.content, json_path.read_bytes())
+
+    def test_missing_schema_generated_live_in_debug(self):
+        """Test the schema is generated live only in DEBUG when it was not built."""
+
+        with override_settings(DEBUG=True):
+            res = self.client.get(SCHEMA_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b"openapi", res.content)
+        with self.assertRaises(ImproperlyConfigured):
+            self.client.get(SCHEMA_URL)
+
+    def test_schema_generated_without_warnings(self):
+        """Test generating the schema reports no warning or error."""
+
+        with mock.patch.object(GENERATOR_STATS, "emit") as emit:
+            build_schema()
+        self.assertEqual([call.args for call in emit.call_args_list], [])
+
+    def test_stats_schema_documents_query_and_response(self):
+        """Test the stats endpoint documents its query parameters and response."""
+
+        _, json_path = build_schema()
+        schema = json.loads(json_path.read_bytes())
+        operation = schema["paths"]["/api/user/{username}/stats"]["get"]
+        self.assertEqual(
+            {param["name"] for param in operation["parameters"]},
+            {"username", "start", "end"},
+        )
+        response = operation["responses"]["200"]["content"]["application/json"]
+        self.assertEqual(response["schema"], {"$ref": "#/components/schemas/Stats"})
+        self.assertIn("days", schema["components"]["schemas"]["Stats"]["properties"])
+
+
+class WarmupTests(SimpleTestCase):
+    """Tests for the worker warmup."""
+
+    def test_warmup_runs_without_database_queries(self):
+        """Test warming up fills the lazy caches without querying the database."""
+
+        schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(schema_dir.cleanup)
+        with override_settings(OPENAPI_SCHEMA_DIR=schema_dir.name):
+            paths = build_schema()
+            self.assertEqual(_schemas, {})
+            warmup()
+            self.assertEqual(set(_schemas), set(paths))
+        self.assertTrue(get_resolver()._populated)
+
+    def test_warmup_through_asgi_handler(self):
+        """Test the ASGI workers warm up through the ASGI handler."""
+
+        with (
+            mock.patch("bloggers.warmup.WSGIHandler") as wsgi_handler,
+            mock.patch(
+                "django.core.handlers.asgi.ASGIHandler.send_response",
+                autospec=True,
+            ) as send_response,
+        ):
+            warmup(request="asgi")
+        wsgi_handler.assert_not_called()
+        (_, response, _), _ = send_response.call_args
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CommentThreadTests(TestCase):
+    """Tests for threaded comment replies."""
+
+    def setUp(self):
+        self.user1 = create_user(
+            email="user1@example.com", password="user1pass", name="User1"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+        self.blog = Blog.objects.create(
+            title="Test Post 1", desc="This is a test post", author=self.user1
+        )
+
+    def reply(self, text, parent=None, blog=None):
+        payload = {"text": text}
+        if parent is not None:
+            payload["parent"] = parent
+        return self.client.post(COMMENT_URL((blog or self.blog).id), payload)
+
+    def test_reply_to_comment_successful(self):
+        """Test replying to a comment counts the reply on its parent."""
+
+        comment = self.reply("Comment")
+        res = self.reply("Reply", parent=comment.data["id"])
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["parent"], comment.data["id"])
+        parent = Comment.objects.get(id=comment.data["id"])
+        self.assertEqual(parent.reply_count, 1)
+        reply = Comment.objects.get(id=res.data["id"])
+        self.assertEqual(reply.depth, 1)
+        self.assertTrue(reply.path.startswith(parent.path))
+
+    def test_reply_to_comment_of_other_blog_not_successful(self):
+        """Test replying to a comment of another blog is not successful."""
+
+        other_blog = Blog.objects.create(
+            title="Test Post 2", desc="This is a test post", author=self.user1
+        )
+        comment = self.reply("Comment", blog=other_blog)
+        res = self.reply("Reply", parent=comment.data["id"])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_thread_paginated_per_level(self):
+        """Test threads are paginated at the top level and limited below it."""
+
+        comments = [self.reply(f"Comment {i}").data["id"] for i in range(3)]
+        replies = [
+            self.reply(f"Reply {i}", parent=comments[1]).data["id"] for i in range(3)
+        ]
+        nested = self.reply("Nested reply", parent=replies[0]).data["id"]
+        self.reply("Nested reply", parent=replies[2])
+
+        # The blog, the page bounds and the thread. The reply beyond the limit
+        # has a reply of its own, which must not be read.
+        with self.assertNumQueries(3):
+            res = self.client.get(COMMENTS_URL(self.blog.id), {"limit": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([c["id"] for c in res.data], comments[:2])
+        thread = res.data[1]
+        self.assertEqual(thread["reply_count"], 3)
+        self.assertEqual([c["id"] for c in thread["replies"]], replies[:2])
+        self.assertEqual(thread["replies"][0]["replies"][0]["id"], nested)
+
+        res = self.client.get(COMMENTS_URL(self.blog.id), {"offset": 2, "limit": 2})
+        self.assertEqual([c["id"] for c in res.data], comments[2:])
+
+        res = self.client.get(REPLIES_URL(comments[1]), {"offset": 2, "depth": 1})
+        self.assertEqual([c["id"] for c in res.data], replies[2:])
+        self.assertEqual(res.data[0]["replies"], [])
+
+    def test_rebuild_comment_threads(self):
+        """Test rebuilding threads restores paths, positions and reply counts."""
+
+        comment = self.reply("Comment").data["id"]
+        reply = self.reply("Reply", parent=comment).data["id"]
+        fields = ["path", "depth", "position"]
+        threads = Comment.objects.order_by("pk").values_list(*fields)
+        expected = list(threads)
+        Comment.objects.update(path="", depth=0, position=0, reply_count=0)
+        Blog.objects.update(thread_count=0)
+
+        call_command("rebuild_comment_threads", stdout=io.StringIO())
+        self.assertEqual(list(threads.all()), expected)
+        self.assertEqual(Comment.objects.get(id=comment).reply_count, 1)
+        self.assertEqual(Blog.objects.get(id=self.blog.id).thread_count, 1)
+
+
+class EventStreamTests(TestCase):
+    """Tests for the live like and comment events."""
+
+    def setUp(self):
+        self.user1 = create_user(
+            email="user1@example.com", password="user1pass", name="User1"
+        )
+        self.user2 = create_user(
+            email="user2@example.com", password="user2pass", name="User2"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user2)
+        self.blog = Blog.objects.create(
+            title="Test Post 1", desc="This is a test post", author=self.user1
+        )
+        self.token = str(AccessToken.for_user(self.user2))
+
+    def test_like_unlike_and_comment_publish_events(self):
+        """Test likes, unlikes and comments are published after commit."""
+
+        bus = mock.Mock()
+        channels = [f"blog:{self.blog.id}", f"user:{self.user1.id}"]
+        with mock.patch("bloggers.events.get_bus", return_value=bus):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(LIKE_URL(self.blog.id))
+                self.client.post(LIKE_URL(self.blog.id))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(UNLIKE_URL(self.blog.id))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(COMMENT_URL(self.blog.id), {"text": "Nice post"})
+
+        events = [event for (channel, event), _ in bus.publish.call_args_list]
+        self.assertEqual(
+            [channel for (channel, _), _ in bus.publish.call_args_list], channels * 3
+        )
+        self.assertEqual(events[0]["type"], "like")
+        self.assertEqual(events[0]["likes_count"], 1)
+        self.assertEqual(events[2]["type"], "unlike")
+        self.assertEqual(events[2]["likes_count"], 0)
+        self.assertEqual(events[4]["type"], "comment")
+        self.assertEqual(events[4]["comment"]["text"], "Nice post")
+        self.assertEqual(events[4]["comment"]["user"], self.user2.username)
+
+    def test_bus_failure_does_not_fail_request(self):
+        """Test a like is created even when its event cannot be published."""
+
+        with mock.patch.object(get_bus(), "publish", side_effect=ConnectionError):
+            with self.assertLogs(level="ERROR"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    res = self.client.post(LIKE_URL(self.blog.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(Like.objects.filter(blog=self.blog).exists())
+
+    async def test_stream_blog_events(self):
+        """Test a blog stream receives its events and heartbeats."""
+
+        client = AsyncClient()
+        with override_settings(EVENT_STREAM_HEARTBEAT=0.01):
+            res = await client.get(BLOG_EVENTS_URL(self.blog.id), {"token": self.token})
+            self.assertEqual(res["Content-Type"], "text/event-stream")
+            content = aiter(res.streaming_content)
+            self.assertEqual(await anext(content), b"retry: 5000\n\n")
+            get_bus().publish(f"blog:{self.blog.id}", {"type": "like", "blog": 1})
+            self.assertEqual(
+                await anext(content),
+                b'event: like\ndata: {"type": "like", "blog": 1}\n\n',
+            )
+            self.assertEqual(await anext(content), b": heartbeat\n\n")
+            res.close()
+        self.assertEqual(connections.total, 0)
+        self.assertFalse(get_bus().subscribers)
+
+    async def test_stream_limits(self):
+        """Test streams are refused past the per user limit and for missing blogs."""
+
+        client = AsyncClient()
+        res = await client.get(BLOG_EVENTS_URL(self.blog.id))
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = await client.get(BLOG_EVENTS_URL(0), {"token": self.token})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        with override_settings(EVENT_STREAM_MAX_USER_CONNECTIONS=1):
+            stream = await client.get(
+                BLOG_EVENTS_URL(self.blog.id),
+                headers={"Authorization": f"Bearer {self.token}"},
+            )
+            res = await client.get(BLOG_EVENTS_URL(self.blog.id), {"token": self.token})
+            self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        stream.close()
+        self.assertEqual(connections.total, 0)
+
+    def test_stream_refused_under_wsgi(self):
+        """Test streams are refused when not served by an ASGI server."""
+
+        res = self.client.get(BLOG_EVENTS_URL(self.blog.id), {"token": self.token})
+        self.assertEqual(res.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertEqual(connections.total, 0)
+
+    async def test_slow_subscriber_overflows(self):
+        """Test a subscriber falling behind is sent overflow and unsubscribed."""
+
+        bus = LocalBus()
+        subscription = bus.subscribe(["blog:1"], queue_size=2)
+        for _ in range(3):
+            bus.publish("blog:1", {"type": "like"})
+        await asyncio.sleep(0)
+        self.assertIs(await subscription.get(), OVERFLOW)
+        self.assertFalse(bus.subscribers)
+        self.assertFalse(bus.heartbeats)
+
+    def test_redis_listener_reconnects(self):
+        """Test the Redis listener logs a lost connection and subscribes again."""
+
+        class Stop(BaseException):
+            pass
+
+        message = {"channel": b"bloggers:blog:1", "data": b'{"type": "like"}'}
+        pubsub = mock.Mock()
+        pubsub.listen.side_effect = [ConnectionError, [message], Stop]
+        bus = RedisBus.__new__(RedisBus)
+        LocalBus.__init__(bus)
+        bus.redis = mock.Mock(**{"pubsub.return_value": pubsub})
+        with (
+            mock.patch.object(bus, "dispatch") as dispatch,
+            mock.patch("bloggers.events.time.sleep") as sleep,
+            self.assertLogs("bloggers.events", level="ERROR"),
+            self.assertRaises(Stop),
+        ):
+            bus.listen()
+        dispatch.assert_called_once_with("blog:1", {"type": "like"})
+        self.assertEqual(pubsub.psubscribe.call_count, 3)
+        self.assertEqual(pubsub.close.call_count, 3)
+        self.assertEqual(
+            [delay for (delay,), _ in sleep.call_args_list],
+            [RedisBus.RECONNECT_DELAY, RedisBus.RECONNECT_DELAY],
+        )
+
+
+class ArchiveTests(TestCase):
+    """Tests for the archival of old blogs."""
+
+    def setUp(self):
+        self.user1 = create_user(
+            email="user1@example.com", password="user1pass", name="User1"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+        self.old_blog = Blog.objects.create(
+            title="Old Post", desc="This is an old post", author=self.user1
+        )
+        self.new_blog = Blog.objects.create(
+            title="New Post", desc="This is a new post", author=self.user1
+        )
+        Blog.objects.filter(pk=self.old_blog.pk).update(
+            created_at=timezone.now() - datetime.timedelta(days=400)
+        )
+        comment = self.client.post(COMMENT_URL(self.old_blog.id), {"text": "Comment"})
+        reply_payload = {"text": "Reply", "parent": comment.data["id"]}
+        self.client.post(COMMENT_URL(self.old_blog.id), reply_payload)
+        self.client.post(LIKE_URL(self.old_blog.id))
+        self.client.post(LIKE_URL(self.new_blog.id))
+
+    def test_old_blogs_archived_and_still_retrieved(self):
+        """Test old blogs leave the hot tables and their permalinks still resolve."""
+
+        before = self.client.get(BLOG_URL(self.old_blog.id)).data
+        author_stats = list(AuthorDailyStats.objects.values_list("day", "likes"))
+        call_command("archive_blogs", batch_size=1, stdout=io.StringIO())
+
+        self.assertEqual(
+            list(Blog.objects.values_list("id", flat=True)), [self.new_blog.id]
+        )
+        self.assertFalse(Comment.objects.filter(blog=self.old_blog.id).exists())
+        self.assertFalse(Like.objects.filter(blog=self.old_blog.id).exists())
+        self.assertEqual(Like.objects.count(), 1)
+        res = self.client.get(BLOG_URL(self.old_blog.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, before)
+        res = self.client.get(BLOG_URL(0))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        call_command("rebuild_stats", stdout=io.StringIO())
+        self.assertEqual(
+            list(AuthorDailyStats.objects.values_list("day", "likes")), author_stats
+        )
+
+    def test_interrupted_archival_resumed(self):
+        """Test a blog being archived is served whole and its archival resumed."""
+
+        before = self.client.get(BLOG_URL(self.old_blog.id)).data
+        archival = start_archival(Blog.objects.get(pk=self.old_blog.pk))
+        archive_batch(archival, batch_size=1)
+        self.assertEqual(ArchivedLike.objects.count(), 1)
+        res = self.client.get(BLOG_URL(self.old_blog.id))
+        self.assertEqual(res.data, before)
+        res = self.client.post(LIKE_URL(self.old_blog.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        rollups = list(AuthorDailyStats.objects.values_list("day", "likes", "comments"))
+        call_command("rebuild_stats", stdout=io.StringIO())
+        self.assertEqual(
+            list(AuthorDailyStats.objects.values_list("day", "likes", "comments")),
+            rollups,
+        )
+
+        call_command("archive_blogs", batch_size=1, stdout=io.StringIO())
+        self.assertFalse(BlogArchival.objects.exists())
+        self.assertEqual(ArchivedComment.objects.count(), 2)
+        self.assertEqual(Blog.all_objects.count(), 1)
+        res = self.client.get(BLOG_URL(self.old_blog.id))
+        self.assertEqual(res.data, before)
+
+    def rollups(self):
+        return list(AuthorDailyStats.objects.values_list("day", "likes", "comments"))
+
+    def test_archived_blog_deleted(self):
+        """Test an archived blog is deleted with its rows and leaves the stats."""
+
+        call_command("archive_blogs", batch_size=1, stdout=io.StringIO())
+        res = self.client.delete(BLOG_URL(self.old_blog.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ArchivedBlog.objects.exists())
+        self.assertFalse(ArchivedComment.objects.exists())
+        self.assertFalse(ArchivedLike.objects.exists())
+        res = self.client.get(BLOG_URL(self.old_blog.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.delete(BLOG_URL(self.old_blog.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        rollups = self.rollups()
+        self.assertEqual(sum(likes for _, likes, _ in rollups), 1)
+        call_command("rebuild_stats", stdout=io.StringIO())
+        self.assertEqual(self.rollups(), rollups)
+
+    def test_blog_being_archived_deleted(self):
+        """Test a blog deleted while being archived is purged instead."""
+
+        archival = start_archival(Blog.objects.get(pk=self.old_blog.pk))
+        archive_batch(archival, batch_size=1)
+        res = self.client.delete(BLOG_URL(self.old_blog.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ArchivedBlog.objects.exists())
+        self.assertFalse(ArchivedLike.objects.exists())
+        self.assertFalse(BlogArchival.objects.exists())
+        res = self.client.get(BLOG_URL(self.old_blog.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        rollups = self.rollups()
+        self.assertEqual(sum(likes for _, likes, _ in rollups), 1)
+        call_command("rebuild_stats", stdout=io.StringIO())
+        self.assertEqual(self.rollups(), rollups)
+        call_command("purge_deleted_blogs", stdout=io.StringIO())
+        self.assertEqual(Blog.all_objects.count(), 1)
+        self.assertFalse(Comment.objects.filter(blog=self.old_blog.id).exists())
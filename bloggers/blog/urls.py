@@ -13,6 +13,9 @@ urlpatterns = [
     path('/my-blogs', blog_view.MyBlogsView.as_view(), name='my-blogs'),
     path('/all-blogs', blog_view.AllBlogsView.as_view(), name='all-blogs'),
     path('/comment/<int:id>', blog_view.CommentView().as_view(), name='comment'),
+    path('/comments/<int:id>', blog_view.CommentThreadView.as_view(), name='comments'),
+    path('/replies/<int:id>', blog_view.CommentRepliesView.as_view(), name='replies'),
     path('/like/<int:id>', blog_view.LikeView().as_view(), name='like'),
     path('/unlike/<int:id>', blog_view.UnLikeView().as_view(), name='unlike'),
+    path('/events/<int:id>', blog_view.BlogEventsView.as_view(), name='events'),
 ]
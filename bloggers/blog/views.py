@@ -2,16 +2,41 @@
 Views for the blog API.
 """
 
-from django.db.models import Count
-from rest_framework import generics, permissions, response, status
+from django.db import transaction
+from django.http import Http404
+from rest_framework import exceptions, generics, permissions, response, status
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from blog.serializers import (
+    BlogListSerializer,
     BlogSerializer,
     BlogWithCommentsSerializer,
+    CommentDetailsSerializer,
     CommentSerializer,
+    CommentThreadQuerySerializer,
+    CommentThreadSerializer,
     LikeSerializer,
 )
-from blog.models import Blog, Like
+from blog.models import Blog, Comment, Like
+from blog import archive, stats
+from bloggers.events import EventStreamView, publish
+
+
+def blog_channels(blog):
+    """Channels of the events of a blog, its own and its author's feed."""
+
+    return [f"blog:{blog.id}", f"user:{blog.author_id}"]
+
+
+def publish_likes(blog, user, event_type):
+    publish(
+        blog_channels(blog),
+        {
+            "type": event_type,
+            "blog": blog.id,
+            "user": user.username,
+            "likes_count": Like.objects.filter(blog=blog).count(),
+        },
+    )
 
 
 class BlogView(generics.CreateAPIView):
@@ -31,21 +56,43 @@ class BlogWithCommentsView(generics.RetrieveDestroyAPIView):
     serializer_class = BlogWithCommentsSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
-    queryset = Blog.objects.annotate(likes_count=Count("likes"))
+    queryset = Blog.objects.with_likes_count().with_details()
     lookup_url_kwarg = "id"
 
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Old permalinks keep resolving once their blog is archived.
+            blog = archive.archived_blog(kwargs["id"])
+            if blog is None:
+                raise
+            return response.Response(self.get_serializer(blog).data)
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except Http404:
+            if not archive.delete_archived_blog(kwargs["id"]):
+                raise
+            return response.Response(status=status.HTTP_204_NO_CONTENT)
+
     def perform_destroy(self, instance):
-        instance.delete()
+        with transaction.atomic():
+            instance.soft_delete()
+            stats.remove_blog(instance)
 
 
 class AllBlogsView(generics.ListAPIView):
     """Retrieve all blogs"""
 
-    serializer_class = BlogWithCommentsSerializer
-    queryset = Blog.objects.annotate(likes_count=Count("likes")).order_by("-created_at")
+    serializer_class = BlogListSerializer
+    queryset = Blog.objects.with_likes_count().with_details(likes=False)
 
     def get_queryset(self):
-        return self.queryset.order_by("-created_at")
+        return self.queryset.with_viewer_state(self.request.user).order_by(
+            "-created_at"
+        )
 
 
 class MyBlogsView(AllBlogsView):
@@ -55,7 +102,11 @@ class MyBlogsView(AllBlogsView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.queryset.filter(author=self.request.user).order_by("-created_at")
+        return (
+            self.queryset.filter(author=self.request.user)
+            .with_viewer_state(self.request.user)
+            .order_by("-created_at")
+        )
 
 
 class CommentView(generics.CreateAPIView):
@@ -68,7 +119,56 @@ class CommentView(generics.CreateAPIView):
     lookup_url_kwarg = "id"
 
     def perform_create(self, serializer):
-        serializer.save(blog=self.get_object(), user=self.request.user)
+        blog = self.get_object()
+        parent = serializer.validated_data.get("parent")
+        if parent is not None and parent.blog_id != blog.id:
+            raise exceptions.ValidationError(
+                {"parent": ["The comment replied to belongs to another blog."]}
+            )
+        with transaction.atomic():
+            comment = serializer.save(blog=blog, user=self.request.user)
+            stats.record_comment(blog, comment)
+        publish(
+            blog_channels(blog),
+            {
+                "type": "comment",
+                "blog": blog.id,
+                "comment": CommentDetailsSerializer(comment).data,
+            },
+        )
+
+
+class CommentThreadView(generics.ListAPIView):
+    """Retrieve a page of the comment threads of a blog"""
+
+    serializer_class = CommentThreadSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = Blog.objects.all()
+    lookup_url_kwarg = "id"
+
+    def list(self, request, *args, **kwargs):
+        blog = self.get_object()
+        comments = Comment.objects.thread(blog.id, **self.get_thread_params())
+        return response.Response(self.get_serializer(comments, many=True).data)
+
+    def get_thread_params(self):
+        params = CommentThreadQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+
+class CommentRepliesView(CommentThreadView):
+    """Retrieve a page of the replies to a comment"""
+
+    queryset = Comment.objects.filter(blog__deleted_at__isnull=True)
+
+    def list(self, request, *args, **kwargs):
+        root = self.get_object()
+        comments = Comment.objects.thread(
+            root.blog_id, root=root, **self.get_thread_params()
+        )
+        return response.Response(self.get_serializer(comments, many=True).data)
 
 
 class LikeView(generics.CreateAPIView):
@@ -81,11 +181,13 @@ class LikeView(generics.CreateAPIView):
     lookup_url_kwarg = "id"
 
     def post(self, request, *args, **kwargs):
-        already_liked = Like.objects.filter(
-            blog=self.get_object(), user=self.request.user
-        ).exists()
+        blog = self.get_object()
+        already_liked = Like.objects.filter(blog=blog, user=self.request.user).exists()
         if not already_liked:
-            Like.objects.create(blog=self.get_object(), user=self.request.user)
+            with transaction.atomic():
+                like = Like.objects.create(blog=blog, user=self.request.user)
+                stats.record_like(blog, like)
+            publish_likes(blog, self.request.user, "like")
         return response.Response(status=status.HTTP_200_OK)
 
 
@@ -99,5 +201,21 @@ class UnLikeView(generics.DestroyAPIView):
     lookup_url_kwarg = "id"
 
     def delete(self, request, *args, **kwargs):
-        Like.objects.filter(blog=self.get_object(), user=self.request.user).delete()
+        blog = self.get_object()
+        with transaction.atomic():
+            like = Like.objects.filter(blog=blog, user=self.request.user).first()
+            if like is not None:
+                like.delete()
+                stats.record_like(blog, like, delta=-1)
+        if like is not None:
+            publish_likes(blog, self.request.user, "unlike")
         return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BlogEventsView(EventStreamView):
+    """Stream the new likes and comments of a blog"""
+
+    async def get_channels(self, request, user, id):
+        if not await Blog.objects.filter(id=id).aexists():
+            raise Http404("No Blog matches the given query.")
+        return [f"blog:{id}"]
@@ -0,0 +1,359 @@
+"""
+Publish/subscribe bus and Server-Sent Events streams for live updates.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from django.views import View
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+HEARTBEAT = object()
+OVERFLOW = object()
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event):
+    """Returns the Server-Sent Events message of the event."""
+
+    data = json.dumps(event, cls=DjangoJSONEncoder)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+class Subscription:
+    """Bounded queue of the events published to some channels.
+
+    Events may be published from any thread, the bus hands them over to the
+    event loop the subscription was created in. A subscriber that falls queue_size
+    events behind is dropped instead of buffering without bound: its queue is
+    emptied and OVERFLOW is the last thing it receives.
+    """
+
+    def __init__(self, bus, channels, queue_size):
+        self.bus = bus
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+            self.close()
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class LocalBus:
+    """In-process bus, events only reach subscribers of the same process"""
+
+    def __init__(self, url=None):
+        self.subscribers = defaultdict(set)
+        self.loops = defaultdict(set)
+        self.heartbeats = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, channels, queue_size):
+        """Subscribes to the channels, must be called from the event loop."""
+
+        subscription = Subscription(self, channels, queue_size)
+        loop = subscription.loop
+        with self.lock:
+            for channel in channels:
+                self.subscribers[channel].add(subscription)
+            if not self.loops[loop]:
+                # A single heartbeat timer per loop, waiting on every queue with
+                # a timeout would cost a timer, and before Python 3.12 a task,
+                # per subscriber.
+                self.heartbeats[loop] = loop.create_task(self.heartbeat(loop))
+            self.loops[loop].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Unsubscribes from every channel, must be called from the event loop."""
+
+        loop = subscription.loop
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscribers[channel].discard(subscription)
+                if not self.subscribers[channel]:
+                    del self.subscribers[channel]
+            if subscription in self.loops.get(loop, ()):
+                self.loops[loop].discard(subscription)
+                if not self.loops[loop]:
+                    del self.loops[loop]
+                    # Responses may be closed from another thread.
+                    loop.call_soon_threadsafe(self.heartbeats.pop(loop).cancel)
+
+    async def heartbeat(self, loop):
+        """Sends HEARTBEAT to the idle subscribers of the loop periodically."""
+
+        while True:
+            await asyncio.sleep(settings.EVENT_STREAM_HEARTBEAT)
+            with self.lock:
+                subscriptions = list(self.loops.get(loop, ()))
+            for subscription in subscriptions:
+                if subscription.queue.empty():
+                    subscription.put(HEARTBEAT)
+
+    def publish(self, channel, event):
+        self.dispatch(channel, event)
+
+    def dispatch(self, channel, event):
+        """Hands the event over to the subscribers of the channel.
+
+        Subscribers are grouped by event loop so that each loop is woken up
+        once per event, not once per subscriber.
+        """
+
+        message = format_event(event)
+        loops = defaultdict(list)
+        with self.lock:
+            for subscription in self.subscribers.get(channel, ()):
+                loops[subscription.loop].append(subscription)
+        for loop, subscriptions in loops.items():
+            loop.call_soon_threadsafe(_put_all, subscriptions, message)
+
+
+def _put_all(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.put(message)
+
+
+class RedisBus(LocalBus):
+    """Bus relaying events between processes through Redis pub/sub"""
+
+    PREFIX = "bloggers:"
+    RECONNECT_DELAY = 0.5
+    MAX_RECONNECT_DELAY = 30
+
+    def __init__(self, url=None):
+        super().__init__()
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                "RedisBus requires the redis package, run `pip install redis`."
+            ) from exc
+        self.redis = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self.listener = None
+
+    def subscribe(self, channels, queue_size):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, daemon=True)
+                self.listener.start()
+        return super().subscribe(channels, queue_size)
+
+    def publish(self, channel, event):
+        self.redis.publish(
+            self.PREFIX + channel, json.dumps(event, cls=DjangoJSONEncoder)
+        )
+
+    def listen(self):
+        """Relays the events published to Redis, reconnecting with exponential
+        backoff whenever the connection is lost. The thread never exits, streams
+        only miss the events published while it is disconnected."""
+
+        delay = self.RECONNECT_DELAY
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(self.PREFIX + "*")
+                delay = self.RECONNECT_DELAY
+                for message in pubsub.listen():
+                    channel = message["channel"].decode()[len(self.PREFIX) :]
+                    self.dispatch(channel, json.loads(message["data"]))
+            except Exception:
+                logger.exception("Event bus listener failed, retrying in %ss", delay)
+            finally:
+                pubsub.close()
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+
+_bus = None
+
+
+def get_bus():
+    """Returns the bus configured by EVENT_BUS_BACKEND, created once per process."""
+
+    global _bus
+    if _bus is None:
+        backend = import_string(settings.EVENT_BUS_BACKEND)
+        _bus = backend(url=settings.EVENT_BUS_URL)
+    return _bus
+
+
+def publish(channels, event):
+    """Publishes the event to the channels once the current transaction commits.
+
+    Events are best effort: a bus failure is logged and never fails the request
+    that already committed the change.
+    """
+
+    def send():
+        bus = get_bus()
+        for channel in channels:
+            bus.publish(channel, event)
+
+    transaction.on_commit(send, robust=True)
+
+
+class ConnectionLimiter:
+    """Counts the open streams of the process, in total and per user"""
+
+    def __init__(self):
+        self.total = 0
+        self.per_user = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def acquire(self, user_id):
+        """Returns an error response when a limit is reached, None otherwise."""
+
+        with self.lock:
+            if self.total >= settings.EVENT_STREAM_MAX_CONNECTIONS:
+                return JsonResponse(
+                    {"detail": "Too many open event streams, retry later."},
+                    status=503,
+                )
+            if self.per_user[user_id] >= settings.EVENT_STREAM_MAX_USER_CONNECTIONS:
+                return JsonResponse(
+                    {"detail": "Too many open event streams for this user."},
+                    status=429,
+                )
+            self.total += 1
+            self.per_user[user_id] += 1
+        return None
+
+    def release(self, user_id):
+        with self.lock:
+            self.total -= 1
+            self.per_user[user_id] -= 1
+            if not self.per_user[user_id]:
+                del self.per_user[user_id]
+
+
+connections = ConnectionLimiter()
+
+
+class EventStreamView(View):
+    """Base view streaming the events of some channels as Server-Sent Events.
+
+    Subclasses implement get_channels. The JWT is read from the Authorization
+    header, or from the token query parameter as EventSource cannot send headers.
+    Streams are only served under ASGI, a WSGI worker would collect the endless
+    stream into a list and hang.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {"detail": "Event streams require an ASGI server."}, status=501
+            )
+        try:
+            user = await self.authenticate(request)
+        except exceptions.APIException as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+        try:
+            channels = await self.get_channels(request, user, *args, **kwargs)
+        except Http404 as exc:
+            return JsonResponse({"detail": str(exc)}, status=404)
+
+        error = connections.acquire(user.pk)
+        if error is not None:
+            return error
+        response = StreamingHttpResponse(
+            EventStream(user, channels), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def get_channels(self, request, user, *args, **kwargs):
+        """Returns the channels to subscribe to, raises Http404 if they do not exist."""
+
+        raise NotImplementedError
+
+    async def authenticate(self, request):
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+        if header is not None:
+            raw_token = authentication.get_raw_token(header)
+        else:
+            raw_token = request.GET.get("token", "").encode()
+        if not raw_token:
+            raise exceptions.NotAuthenticated()
+        validated_token = authentication.get_validated_token(raw_token)
+        return await sync_to_async(authentication.get_user)(validated_token)
+
+
+class EventStream:
+    """Server-Sent Events stream of the events published to some channels.
+
+    The connection slot is released when the response is closed, or when the
+    stream ends if it was consumed, whichever comes first.
+    """
+
+    def __init__(self, user, channels):
+        self.user = user
+        self.channels = channels
+        self.subscription = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def __aiter__(self):
+        return self.stream()
+
+    async def stream(self):
+        self.subscription = get_bus().subscribe(
+            self.channels, settings.EVENT_STREAM_QUEUE_SIZE
+        )
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = await self.subscription.get()
+                if event is HEARTBEAT:
+                    # Keeps proxies from closing the connection and detects
+                    # clients that went away.
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is OVERFLOW:
+                    yield format_event({"type": "overflow"})
+                    return
+                yield event
+        finally:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        if self.subscription is not None:
+            self.subscription.close()
+        connections.release(self.user.pk)
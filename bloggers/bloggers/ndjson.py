@@ -0,0 +1,298 @@
+"""
+Streaming NDJSON export and import of users, follows, blogs, comments and likes,
+live and archived.
+"""
+
+import datetime
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from user.models import User, Follow
+from blog.models import (
+    ArchivedBlog,
+    ArchivedComment,
+    ArchivedLike,
+    Blog,
+    BlogArchival,
+    Comment,
+    Like,
+)
+
+
+class ModelSpec:
+    """Describes how a model is written to and read from NDJSON records"""
+
+    def __init__(
+        self,
+        label,
+        model,
+        fields,
+        user_fields=(),
+        id_fields=(),
+        filters=None,
+        key="id",
+    ):
+        self.label = label
+        self.model = model
+        self.fields = list(fields)
+        self.user_fields = list(user_fields)
+        self.id_fields = list(id_fields)
+        self.filters = filters or Q()
+        # Unique field identifying a record that was already imported.
+        self.key = key
+
+    def columns(self):
+        """Columns read on export, user references are exported by username."""
+
+        return (
+            self.fields
+            + [f"{name}__username" for name in self.user_fields]
+            + [f"{name}_id" for name in self.id_fields]
+        )
+
+
+# Blogs being copied to the archive are exported whole from the hot tables and
+# not from the archive. Deleted blogs waiting to be purged are not exported, nor
+# are their rows.
+LIVE = Q(deleted_at__isnull=True) | Q(archival__copied=False)
+LIVE_BLOG = Q(blog__deleted_at__isnull=True) | Q(blog__archival__copied=False)
+COPYING = BlogArchival.objects.filter(copied=False).values("blog")
+
+# Ordered so that every record only references records exported before it.
+SPECS = [
+    ModelSpec(
+        "user.user",
+        User,
+        [
+            "username",
+            "email",
+            "password",
+            "name",
+            "is_active",
+            "is_staff",
+            "is_superuser",
+            "last_login",
+        ],
+        key="username",
+    ),
+    ModelSpec(
+        "user.follow",
+        Follow,
+        ["id", "created_at"],
+        user_fields=["follower", "following"],
+    ),
+    ModelSpec(
+        "blog.blog",
+        Blog,
+        ["id", "title", "desc", "created_at", "thread_count"],
+        user_fields=["author"],
+        filters=LIVE,
+    ),
+    ModelSpec(
+        "blog.comment",
+        Comment,
+        ["id", "text", "path", "depth", "position", "reply_count", "created_at"],
+        ["user"],
+        id_fields=["blog", "parent"],
+        filters=LIVE_BLOG,
+    ),
+    ModelSpec(
+        "blog.like",
+        Like,
+        ["id", "created_at"],
+        ["user"],
+        id_fields=["blog"],
+        filters=LIVE_BLOG,
+    ),
+    ModelSpec(
+        "blog.archivedblog",
+        ArchivedBlog,
+        ["id", "title", "desc", "created_at", "thread_count", "archived_at"],
+        user_fields=["author"],
+        filters=~Q(id__in=COPYING),
+    ),
+    ModelSpec(
+        "blog.archivedcomment",
+        ArchivedComment,
+        ["id", "text", "path", "depth", "position", "reply_count", "created_at"],
+        ["user"],
+        id_fields=["blog", "parent"],
+        filters=~Q(blog__in=COPYING),
+    ),
+    ModelSpec(
+        "blog.archivedlike",
+        ArchivedLike,
+        ["id", "created_at"],
+        ["user"],
+        id_fields=["blog"],
+        filters=~Q(blog__in=COPYING),
+    ),
+]
+
+SPECS_BY_LABEL = {spec.label: spec for spec in SPECS}
+
+
+class RecordEncoder(DjangoJSONEncoder):
+    """JSON encoder keeping the full precision of datetimes"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class RecordError(ValueError):
+    """Raised when an NDJSON record cannot be imported"""
+
+
+def export_ndjson(stream, chunk_size=2000):
+    """Writes every record to the stream, one JSON object per line.
+
+    Rows are read with keyset pagination on the primary key, so at most
+    chunk_size rows are held in memory whatever the size of the tables.
+    """
+
+    count = 0
+    for spec in SPECS:
+        columns = spec.columns()
+        queryset = spec.model._base_manager.filter(spec.filters).order_by("pk")
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(chunk.values_list("pk", *columns)[:chunk_size])
+            if not rows:
+                break
+            for row in rows:
+                fields = {}
+                for column, value in zip(columns, row[1:]):
+                    fields[column.split("__")[0].removesuffix("_id")] = value
+                record = {"model": spec.label, "fields": fields}
+                stream.write(json.dumps(record, cls=RecordEncoder) + "\n")
+                count += 1
+            last_pk = rows[-1][0]
+    return count
+
+
+def import_ndjson(stream, batch_size=1000, checkpoint=None):
+    """Reads records from the stream and bulk creates them in batches.
+
+    Each batch is committed in its own transaction. When a checkpoint path is
+    given the number of lines committed is written to it after every batch and
+    lines before it are skipped, so an interrupted import can be resumed.
+    Records that already exist are skipped and left untouched, so replaying a
+    batch is harmless. References to missing blogs or comments raise RecordError.
+    The engagement rollups are not maintained, run rebuild_stats afterwards.
+    """
+
+    skip = _read_checkpoint(checkpoint)
+    batch = []
+    batch_spec = None
+    line_number = 0
+    count = 0
+    for line_number, line in enumerate(stream, start=1):
+        if line_number <= skip or not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            spec = SPECS_BY_LABEL[record["model"]]
+        except (ValueError, KeyError) as exc:
+            raise RecordError(f"Line {line_number}: invalid record ({exc})") from exc
+        if batch and (spec is not batch_spec or len(batch) >= batch_size):
+            count += _flush(batch_spec, batch)
+            _write_checkpoint(checkpoint, line_number - 1)
+            batch = []
+        batch_spec = spec
+        batch.append((line_number, record["fields"]))
+    if batch:
+        count += _flush(batch_spec, batch)
+    _write_checkpoint(checkpoint, line_number)
+    return count
+
+
+def _flush(spec, batch):
+    """Resolves the references of a batch of records and bulk creates the ones
+    that do not exist yet. Returns the number of rows created."""
+
+    keys = [fields.get(spec.key) for _, fields in batch]
+    existing = set(
+        spec.model._base_manager.filter(**{f"{spec.key}__in": keys}).values_list(
+            spec.key, flat=True
+        )
+    )
+    batch = [record for record in batch if record[1].get(spec.key) not in existing]
+    if not batch:
+        return 0
+
+    usernames = {fields[name] for _, fields in batch for name in spec.user_fields}
+    user_ids = dict(
+        User.objects.filter(username__in=usernames).values_list("username", "pk")
+    )
+    known_ids = {}
+    for name in spec.id_fields:
+        model = spec.model._meta.get_field(name).related_model
+        ids = {fields[name] for _, fields in batch if fields.get(name) is not None}
+        known_ids[name] = set(
+            model._base_manager.filter(pk__in=ids).values_list("pk", flat=True)
+        )
+
+    objs = []
+    for line_number, fields in batch:
+        values = {}
+        for name in spec.fields:
+            if name in fields:
+                values[name] = spec.model._meta.get_field(name).to_python(fields[name])
+        for name in spec.user_fields:
+            if fields.get(name) not in user_ids:
+                raise RecordError(
+                    f"Line {line_number}: unknown user {fields.get(name)!r} for {name}"
+                )
+            values[f"{name}_id"] = user_ids[fields[name]]
+        for name in spec.id_fields:
+            if fields.get(name) is not None and fields[name] not in known_ids[name]:
+                raise RecordError(
+                    f"Line {line_number}: unknown {name} {fields[name]!r}"
+                )
+            values[f"{name}_id"] = fields.get(name)
+        objs.append(spec.model(**values))
+        for name in spec.id_fields:
+            if spec.model._meta.get_field(name).related_model is spec.model:
+                # Replies may refer to a parent created earlier in the same batch.
+                known_ids[name].add(values["id"])
+
+    with transaction.atomic():
+        spec.model.objects.bulk_create(objs)
+        # auto_now_add overwrites these fields on insert, restore the exported values.
+        restore = [
+            name
+            for name in spec.fields
+            if getattr(spec.model._meta.get_field(name), "auto_now_add", False)
+        ]
+        if restore:
+            for obj, (_, fields) in zip(objs, batch):
+                for name in restore:
+                    if fields.get(name):
+                        field = spec.model._meta.get_field(name)
+                        setattr(obj, name, field.to_python(fields[name]))
+            spec.model.objects.bulk_update(objs, restore)
+    return len(objs)
+
+
+def _read_checkpoint(path):
+    """Returns the number of lines already committed by a previous import."""
+
+    if not path:
+        return 0
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, line_number):
+    """Records the number of lines committed so far."""
+
+    if path:
+        with open(path, "w") as f:
+            f.write(str(line_number))
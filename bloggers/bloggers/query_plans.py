@@ -0,0 +1,151 @@
+"""
+EXPLAIN based query plan checks for the API views.
+"""
+
+import json
+from types import SimpleNamespace
+from django.db import connections
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+def explain_problems(queryset):
+    """Runs EXPLAIN on the queryset and returns the full scans and filesorts found."""
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "mysql":
+        return _mysql_problems(json.loads(queryset.explain(format="JSON")))
+
+    problems = []
+    for line in queryset.explain().splitlines():
+        line = line.strip()
+        if vendor == "sqlite":
+            # e.g. "2 0 0 SCAN blog_blog" or "... USE TEMP B-TREE FOR ORDER BY"
+            detail = line.split(" ", 3)[-1]
+            if detail.startswith("SCAN ") and " USING " not in detail:
+                problems.append(f"full scan: {detail[5:]}")
+            elif "TEMP B-TREE FOR ORDER BY" in detail:
+                problems.append("filesort")
+        elif vendor == "postgresql":
+            if "Seq Scan on " in line:
+                problems.append(
+                    f"full scan: {line.split('Seq Scan on ')[1].split()[0]}"
+                )
+            elif line.lstrip("-> ").startswith("Sort "):
+                problems.append("filesort")
+    return problems
+
+
+def _mysql_problems(plan):
+    """Walks a MySQL FORMAT=JSON plan collecting full scans and filesorts."""
+
+    problems = []
+    if isinstance(plan, dict):
+        if plan.get("access_type") == "ALL":
+            problems.append(f"full scan: {plan.get('table_name')}")
+        if plan.get("using_filesort"):
+            problems.append("filesort")
+        for value in plan.values():
+            problems += _mysql_problems(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            problems += _mysql_problems(value)
+    return problems
+
+
+def view_querysets(user, blog_id):
+    """Returns the named querysets run by the API views for the given user and blog."""
+
+    from blog import views as blog_view
+    from blog.models import (
+        ArchivedBlog,
+        ArchivedComment,
+        ArchivedLike,
+        AuthorDailyStats,
+        Blog,
+        BlogDailyStats,
+        Comment,
+        Like,
+    )
+    from user.models import Follow
+
+    def queryset_for(view_class):
+        view = view_class()
+        view.request = SimpleNamespace(user=user)
+        view.kwargs = {}
+        view.format_kwarg = None
+        return view.get_queryset()
+
+    followed = Follow.objects.filter(follower=user)
+    today = timezone.localdate()
+    return {
+        "AllBlogsView": queryset_for(blog_view.AllBlogsView),
+        "MyBlogsView": queryset_for(blog_view.MyBlogsView),
+        "BlogWithCommentsView": queryset_for(blog_view.BlogWithCommentsView).filter(
+            pk=blog_id
+        ),
+        "BlogWithCommentsView.archive": ArchivedBlog.objects.filter(pk=blog_id),
+        "BlogWithCommentsView.archive.likes": ArchivedLike.objects.filter(blog=blog_id),
+        "BlogWithCommentsView.archive.comments": ArchivedComment.objects.filter(
+            blog=blog_id
+        ),
+        "archive_blogs": Blog.objects.filter(created_at__lt=timezone.now()).order_by(
+            "created_at"
+        ),
+        "archive_batch.likes": Like.objects.filter(
+            Q(user_id__gt=0) | Q(user_id=0, pk__gt=0), blog=blog_id, user_id__gte=0
+        ).order_by("user", "pk"),
+        "archive_batch.comments": Comment.objects.filter(
+            blog=blog_id, path__gt=""
+        ).order_by("path"),
+        "BlogWithCommentsSerializer.likes": Like.objects.filter(blog=blog_id),
+        "BlogWithCommentsSerializer.comments": Comment.objects.filter(blog=blog_id),
+        "CommentThreadView.page": Comment.objects.filter(
+            blog=blog_id, parent=None, position__gt=0, position__lte=20
+        ),
+        "CommentThreadView.thread": Comment.objects.filter(
+            Q(depth=0)
+            | Q(depth=1, position__lte=20)
+            | Q(depth=2, position__lte=20, parent__position__lte=20),
+            blog=blog_id,
+            path__gte="0",
+            path__lt="1",
+            depth__lt=3,
+        ).order_by("path"),
+        "BlogPurge.comments": Comment.objects.filter(blog=blog_id).order_by("-path"),
+        "LikeView": Like.objects.filter(blog=blog_id, user=user),
+        "FollowView": Follow.objects.filter(follower=user, following=user),
+        "recommendations.mutuals": Follow.objects.filter(follower__in=[user])
+        .exclude(following__in=followed.values("following"))
+        .values("following")
+        .annotate(mutuals=Count("follower", distinct=True)),
+        "StatsView.days": AuthorDailyStats.objects.filter(
+            author=user, day__range=(today, today)
+        ).order_by("day"),
+        "StatsView.blogs": BlogDailyStats.objects.filter(
+            author=user, day__range=(today, today)
+        )
+        .values("blog")
+        .annotate(likes=Sum("likes")),
+        "UserDetailsSerializer.follower": Follow.objects.filter(following=user),
+        "UserDetailsSerializer.following": Follow.objects.filter(follower=user),
+    }
+
+
+# Listing every blog reads the whole table by design, it only has to avoid the sort.
+EXPECTED_PROBLEMS = {"AllBlogsView": {"full scan: blog_blog"}}
+
+
+def check_query_plans(user, blog_id):
+    """Returns the unexpected plan problems of every view queryset keyed by name."""
+
+    report = {}
+    for name, queryset in view_querysets(user, blog_id).items():
+        problems = [
+            problem
+            for problem in explain_problems(queryset)
+            if problem not in EXPECTED_PROBLEMS.get(name, set())
+        ]
+        if problems:
+            report[name] = problems
+    return report
@@ -0,0 +1,76 @@
+"""
+Precomputed OpenAPI schema served from memory.
+"""
+
+import hashlib
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+RENDERERS = {"yaml": OpenApiYamlRenderer, "json": OpenApiJsonRenderer}
+
+_schemas = {}
+
+
+def schema_path(format):
+    """Returns the path of the schema file for the current API version."""
+
+    version = spectacular_settings.VERSION
+    return Path(settings.OPENAPI_SCHEMA_DIR) / f"openapi-{version}.{format}"
+
+
+def build_schema():
+    """Generates the schema and writes it in every format, returns the paths."""
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    paths = []
+    for format, renderer_class in RENDERERS.items():
+        path = schema_path(format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(renderer_class().render(schema, renderer_context={}))
+        paths.append(path)
+    _schemas.clear()
+    return paths
+
+
+def load_schema(format):
+    """Returns the (content, etag) of the schema file, read once per process."""
+
+    path = schema_path(format)
+    if path not in _schemas:
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        _schemas[path] = (content, f'"{hashlib.sha256(content).hexdigest()}"')
+    return _schemas[path]
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """Serve the schema written by the build_schema command with an ETag"""
+
+    # Overriding get drops the schema of the parent's decorated get.
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        renderer, _ = self.perform_content_negotiation(request, force=True)
+        schema = load_schema(renderer.format)
+        if schema is None:
+            if settings.DEBUG:
+                return super().get(request, *args, **kwargs)
+            raise ImproperlyConfigured(
+                f"{schema_path(renderer.format)} is missing, "
+                "run `python manage.py build_schema`."
+            )
+        content, etag = schema
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=renderer.media_type)
+        response["ETag"] = etag
+        return response
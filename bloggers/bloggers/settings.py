@@ -5,12 +5,13 @@ Django settings for bloggers project.
 import os
 from pathlib import Path
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
 
-DEBUG = (os.environ.get("DEBUG") == "True")
+DEBUG = os.environ.get("DEBUG") == "True"
 
 ALLOWED_HOSTS = ["*"]
 
@@ -25,6 +26,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "rest_framework",
     "rest_framework_simplejwt",
+    "rest_framework_simplejwt.token_blacklist",
     "drf_spectacular",
     "user",
     "blog",
@@ -40,6 +42,27 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# The "api" profile serves only the JWT authenticated API: the admin and the
+# session, messages and CSRF machinery it needs are left out.
+MIDDLEWARE_PROFILE = os.environ.get("MIDDLEWARE_PROFILE", "full")
+
+if MIDDLEWARE_PROFILE == "api":
+    INSTALLED_APPS = [
+        app
+        for app in INSTALLED_APPS
+        if app
+        not in (
+            "django.contrib.admin",
+            "django.contrib.sessions",
+            "django.contrib.messages",
+        )
+    ]
+    MIDDLEWARE = [
+        "django.middleware.security.SecurityMiddleware",
+        "django.middleware.common.CommonMiddleware",
+        "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    ]
+
 ROOT_URLCONF = "bloggers.urls"
 
 TEMPLATES = [
@@ -72,6 +95,31 @@ DATABASES = {
     }
 }
 
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "argon2")
+
+PASSWORD_HASHER_CLASSES = {
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "scrypt": "django.contrib.auth.hashers.ScryptPasswordHasher",
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+}
+
+if PASSWORD_HASHER not in PASSWORD_HASHER_CLASSES:
+    raise ImproperlyConfigured(
+        f"PASSWORD_HASHER must be one of {', '.join(PASSWORD_HASHER_CLASSES)}, "
+        f"not {PASSWORD_HASHER!r}."
+    )
+
+# The first entry hashes new passwords; the others only verify existing hashes,
+# which are upgraded to the preferred hasher on the next successful login.
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    hasher
+    for hasher in [
+        *PASSWORD_HASHER_CLASSES.values(),
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    ]
+    if hasher != PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -109,4 +157,57 @@ REST_FRAMEWORK = {
     ],
 }
 
-SIMPLE_JWT = {"ACCESS_TOKEN_LIFETIME": timedelta(hours=1), "USER_ID_FIELD": "username"}
+SPECTACULAR_SETTINGS = {"TITLE": "Bloggers API", "VERSION": "1.0.0"}
+
+OPENAPI_SCHEMA_DIR = BASE_DIR / "schema"
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
+    "ROTATE_REFRESH_TOKENS": True,
+    "BLACKLIST_AFTER_ROTATION": True,
+    "USER_ID_FIELD": "username",
+}
+
+# Bus relaying live events to the Server-Sent Events streams. LocalBus only
+# reaches streams of the same process, use bloggers.events.RedisBus with more
+# than one worker.
+EVENT_BUS_BACKEND = os.environ.get("EVENT_BUS_BACKEND", "bloggers.events.LocalBus")
+
+EVENT_BUS_URL = os.environ.get("EVENT_BUS_URL")
+
+EVENT_STREAM_HEARTBEAT = 15
+
+EVENT_STREAM_QUEUE_SIZE = 100
+
+EVENT_STREAM_MAX_CONNECTIONS = int(
+    os.environ.get("EVENT_STREAM_MAX_CONNECTIONS", 10000)
+)
+
+EVENT_STREAM_MAX_USER_CONNECTIONS = int(
+    os.environ.get("EVENT_STREAM_MAX_USER_CONNECTIONS", 5)
+)
+
+# Shared by every worker, so that dropping a cached value reaches them all. The
+# database cache table is created with `python manage.py createcachetable`, which
+# the container runs on start. Set CACHE_BACKEND to
+# django.core.cache.backends.redis.RedisCache and CACHE_LOCATION to a Redis url
+# to use Redis instead.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "bloggers_cache"),
+    }
+}
+
+# Who-to-follow recommendations are cached per user, and only walk the most
+# recently followed users of someone following more than this many.
+RECOMMENDATIONS_CACHE_TIMEOUT = 3600
+
+RECOMMENDATIONS_MAX_FOLLOWING = 500
+
+# Blogs created more than this many days ago are moved to the archive tables
+# by the archive_blogs command.
+BLOG_ARCHIVE_AFTER_DAYS = int(os.environ.get("BLOG_ARCHIVE_AFTER_DAYS", 365))
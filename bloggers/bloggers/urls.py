@@ -3,21 +3,26 @@ URL configuration for bloggers project.
 """
 
 
+from django.apps import apps
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenObtainPairView
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView
+from rest_framework_simplejwt.views import (
+    TokenObtainPairView,
+    TokenRefreshView,
+    TokenVerifyView
 )
+from drf_spectacular.views import SpectacularSwaggerView
+from bloggers.schema import CachedSpectacularAPIView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/schema', SpectacularAPIView.as_view(), name='api-schema'),
+    path('api/schema', CachedSpectacularAPIView.as_view(), name='api-schema'),
     path('api/docs', SpectacularSwaggerView.as_view(url_name='api-schema'), name='api-docs'),
     path('api/authenticate', TokenObtainPairView.as_view(), name='authenticate'),
+    path('api/authenticate/refresh', TokenRefreshView.as_view(), name='refresh-token'),
+    path('api/authenticate/verify', TokenVerifyView.as_view(), name='verify-token'),
     path('api/user', include('user.urls')),
     path('api/blogs', include('blog.urls'))
 ]
 
- 
\ No newline at end of file
+if apps.is_installed('django.contrib.admin'):
+    urlpatterns.append(path('admin/', admin.site.urls))
@@ -0,0 +1,106 @@
+"""
+Warm up the application before workers accept traffic.
+"""
+
+import asyncio
+import io
+import json
+from django.apps import apps
+from django.contrib.auth.hashers import get_hashers
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework import serializers
+from rest_framework_simplejwt.state import token_backend
+from rest_framework_simplejwt.tokens import AccessToken
+from bloggers.schema import RENDERERS, load_schema
+
+
+def warmup(request="wsgi"):
+    """Populates the lazily built caches that would otherwise be paid on the
+    first requests of every worker. Run in the gunicorn master with preloading,
+    the warmed up state is shared with the workers through copy-on-write.
+
+    request is the handler serving the application, "wsgi" or "asgi", that a
+    sample request is run through, or None to skip it.
+    """
+
+    get_resolver()._populate()
+
+    for app_config in apps.get_app_configs():
+        for model in app_config.get_models():
+            model._meta.get_fields()
+    for serializer_class in _subclasses(serializers.ModelSerializer):
+        if serializer_class.__module__.split(".")[0] in ("blog", "user"):
+            serializer_class().fields
+
+    get_hashers()
+    token_backend.decode(str(AccessToken()))
+    for format in RENDERERS:
+        load_schema(format)
+
+    # Runs a request through the middleware, DRF and JWT stack without a database.
+    if request == "wsgi":
+        _wsgi_request()
+    elif request == "asgi":
+        asyncio.run(_asgi_request())
+
+    # Connections must not be shared with the forked workers.
+    connections.close_all()
+
+
+WARMUP_PATH = "/api/authenticate/verify"
+WARMUP_BODY = json.dumps({"token": "warmup"}).encode()
+
+
+def _wsgi_request():
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": WARMUP_PATH,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(WARMUP_BODY)),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(WARMUP_BODY),
+    }
+    WSGIHandler()(environ, lambda status, headers: None).close()
+
+
+async def _asgi_request():
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": WARMUP_PATH,
+        "raw_path": WARMUP_PATH.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(WARMUP_BODY)).encode()),
+        ],
+        "server": ("localhost", 80),
+    }
+    messages = [{"type": "http.request", "body": WARMUP_BODY, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # The client stays connected until the response is sent.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        pass
+
+    await ASGIHandler()(scope, receive, send)
+
+
+def _subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
@@ -0,0 +1,49 @@
+"""
+Gunicorn configuration for bloggers project.
+"""
+
+import os
+
+# The API is served by sync workers. The event streams hold their connection
+# open and are refused with 501 there, they are served by a second gunicorn
+# started with GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker, to which the
+# proxy routes the /events paths.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+
+asgi = worker_class.startswith("uvicorn")
+
+if asgi:
+    wsgi_app = "bloggers.asgi:application"
+else:
+    wsgi_app = "bloggers.wsgi:application"
+
+bind = os.environ.get("GUNICORN_BIND", ":8000")
+
+workers = int(os.environ.get("GUNICORN_WORKERS", 3))
+
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+
+# Load the application once in the master so that workers share its memory
+# pages copy-on-write instead of each importing Django and the apps again.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "True") == "True"
+
+
+def when_ready(server):
+    """Warm up the preloaded application before the workers are forked."""
+
+    if preload_app:
+        from bloggers.warmup import warmup
+
+        # The ASGI handler runs sync code in a thread, which would not survive
+        # the fork, so its sample request is left to the workers.
+        warmup(request=None if asgi else "wsgi")
+
+
+def post_worker_init(worker):
+    """Warm up each worker when the application is not preloaded, and the
+    ASGI handler of each worker."""
+
+    if asgi or not preload_app:
+        from bloggers.warmup import warmup
+
+        warmup(request="asgi" if asgi else "wsgi")
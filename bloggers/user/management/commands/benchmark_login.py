@@ -0,0 +1,39 @@
+"""
+Benchmark login throughput of the configured password hashers.
+"""
+
+import time
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Measure password checks per second of a single worker"""
+
+    help = "Measure login throughput per worker for each configured password hasher."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--password", default="benchmark-pass")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        password = options["password"]
+        seen = set()
+        for hasher in get_hashers():
+            if hasher.algorithm in seen:
+                continue
+            seen.add(hasher.algorithm)
+            try:
+                encoded = hasher.encode(password, hasher.salt())
+            except ValueError as exc:
+                self.stdout.write(f"{hasher.algorithm:<16} skipped ({exc})")
+                continue
+            start = time.perf_counter()
+            for _ in range(iterations):
+                hasher.verify(password, encoded)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{hasher.algorithm:<16} {elapsed / iterations * 1000:8.1f} ms/login "
+                f"{iterations / elapsed:8.1f} logins/s per worker"
+            )
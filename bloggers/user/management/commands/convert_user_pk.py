@@ -0,0 +1,276 @@
+"""
+Convert the varchar username primary key of users to a BIGINT id online.
+
+Databases created before users had an integer id keep the username as the
+primary key of user_user and as the value of every foreign key to it. The
+conversion runs in phases against a live MySQL database:
+
+    report    index sizes of the affected tables and the speed of user joins
+    prepare   add an AUTO_INCREMENT id to user_user, a BIGINT shadow column
+              next to every foreign key and triggers keeping it up to date
+    backfill  fill the shadow columns in batches of primary key ranges
+    cutover   swap the shadow columns in, move the primary key to id and
+              recreate indexes and foreign keys, run with writes paused while
+              deploying this code
+
+Every ALTER of cutover runs with ALGORITHM=INPLACE, LOCK=NONE, and foreign keys
+are added with foreign_key_checks off as the backfilled values come from
+user_user, so no table is copied and the pause stays short. Each table is
+swapped in a single statement and cutover skips what an earlier run already
+did, so it can be run again after a failure.
+
+Run report before prepare and again after cutover to compare.
+"""
+
+import time
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.utils import truncate_name
+from user.models import User
+
+SHADOW_SUFFIX = "_new"
+ONLINE = "ALGORITHM=INPLACE, LOCK=NONE"
+
+
+def user_references():
+    """Returns (table, pk column, column, null) of every foreign key to users."""
+
+    references = []
+    for model in apps.get_models(include_auto_created=True):
+        if model._meta.proxy or not model._meta.managed:
+            continue
+        for field in model._meta.local_fields:
+            if field.many_to_one or field.one_to_one:
+                if field.remote_field.model is User:
+                    references.append(
+                        (
+                            model._meta.db_table,
+                            model._meta.pk.column,
+                            field.column,
+                            field.null,
+                        )
+                    )
+    return references
+
+
+class Command(BaseCommand):
+    """Migrate users to an integer primary key without long table locks"""
+
+    help = "Convert the username primary key of users to a BIGINT id, in phases."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "phase", choices=["report", "prepare", "backfill", "cutover"]
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--pause", type=float, default=0, help="seconds to sleep between batches"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "mysql":
+            raise CommandError(
+                "Only MySQL databases created with the username primary key need "
+                "converting, other databases are created with the id already."
+            )
+        self.user_table = User._meta.db_table
+        self.cursor = connection.cursor()
+        getattr(self, options["phase"])(options)
+
+    def q(self, name):
+        return connection.ops.quote_name(name)
+
+    def execute(self, sql, params=None):
+        self.cursor.execute(sql, params)
+        return self.cursor
+
+    def columns(self, table):
+        return {
+            column.name
+            for column in connection.introspection.get_table_description(
+                self.cursor, table
+            )
+        }
+
+    def primary_key(self, table):
+        return self.execute(
+            "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND CONSTRAINT_NAME = 'PRIMARY'",
+            [table],
+        ).fetchone()[0]
+
+    def report(self, options):
+        tables = [self.user_table] + sorted(
+            {table for table, _, _, _ in user_references()}
+        )
+        self.stdout.write(f"{'table':<40} {'data MiB':>10} {'index MiB':>10}")
+        for table in tables:
+            self.execute(f"ANALYZE TABLE {self.q(table)}").fetchall()
+            data, index = self.execute(
+                "SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            ).fetchone()
+            self.stdout.write(
+                f"{table:<40} {data / 2**20:>10.2f} {index / 2**20:>10.2f}"
+            )
+
+        user_pk = self.primary_key(self.user_table)
+        for table, _, column, _ in user_references():
+            sql = (
+                f"SELECT COUNT(*) FROM {self.q(table)} t JOIN {self.q(self.user_table)}"
+                f" u ON u.{self.q(user_pk)} = t.{self.q(column)}"
+            )
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                self.execute(sql).fetchall()
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"join {table}.{column} on user_user.{user_pk}: "
+                f"{min(timings) * 1000:.1f} ms"
+            )
+
+    def prepare(self, options):
+        if "id" not in self.columns(self.user_table):
+            # Rebuilds user_user only, the large tables below are altered in place.
+            self.execute(
+                f"ALTER TABLE {self.q(self.user_table)} "
+                "ADD COLUMN id BIGINT NOT NULL AUTO_INCREMENT, "
+                f"ADD UNIQUE KEY {self.q(self.user_table + '_id_uniq')} (id)"
+            )
+        for table, _, column, _ in user_references():
+            shadow = column + SHADOW_SUFFIX
+            if shadow not in self.columns(table):
+                self.execute(
+                    f"ALTER TABLE {self.q(table)} "
+                    f"ADD COLUMN {self.q(shadow)} BIGINT NULL"
+                )
+            for event, suffix in (("INSERT", "ins"), ("UPDATE", "upd")):
+                trigger = self.q(truncate_name(f"{table}_{column}_pk_{suffix}", 64))
+                self.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                self.execute(
+                    f"CREATE TRIGGER {trigger} BEFORE {event} ON {self.q(table)} "
+                    f"FOR EACH ROW SET NEW.{self.q(shadow)} = (SELECT id FROM "
+                    f"{self.q(self.user_table)} WHERE username = NEW.{self.q(column)})"
+                )
+            self.stdout.write(f"Prepared {table}.{column}")
+
+    def backfill(self, options):
+        for table, pk, column, _ in user_references():
+            shadow = column + SHADOW_SUFFIX
+            low, high = self.execute(
+                f"SELECT MIN({self.q(pk)}), MAX({self.q(pk)}) FROM {self.q(table)}"
+            ).fetchone()
+            if low is None:
+                continue
+            for start in range(low, high + 1, options["batch_size"]):
+                end = start + options["batch_size"] - 1
+                self.execute(
+                    f"UPDATE {self.q(table)} t JOIN {self.q(self.user_table)} u "
+                    f"ON u.username = t.{self.q(column)} SET t.{self.q(shadow)} = u.id "
+                    f"WHERE t.{self.q(pk)} BETWEEN %s AND %s "
+                    f"AND t.{self.q(shadow)} IS NULL",
+                    [start, end],
+                )
+                self.stdout.write(f"{table}.{column}: {min(end, high)}/{high}")
+                time.sleep(options["pause"])
+
+    def cutover(self, options):
+        # Tables swapped by an earlier, interrupted, run have no shadow column.
+        references = [
+            (table, column, null)
+            for table, _, column, null in user_references()
+            if column + SHADOW_SUFFIX in self.columns(table)
+        ]
+        for table, column, _ in references:
+            missing = self.execute(
+                f"SELECT COUNT(*) FROM {self.q(table)} WHERE {self.q(column)} "
+                f"IS NOT NULL AND {self.q(column + SHADOW_SUFFIX)} IS NULL"
+            ).fetchone()[0]
+            if missing:
+                raise CommandError(
+                    f"{missing} rows of {table}.{column} are not backfilled, "
+                    "run the backfill phase again."
+                )
+
+        for table, column, null in references:
+            self.swap_column(table, column, null)
+        if self.primary_key(self.user_table) != "id":
+            self.execute(
+                f"ALTER TABLE {self.q(self.user_table)} DROP PRIMARY KEY, "
+                f"ADD PRIMARY KEY (id), "
+                f"DROP KEY {self.q(self.user_table + '_id_uniq')}, "
+                f"ADD UNIQUE KEY {self.q(self.user_table + '_username_uniq')} "
+                f"(username), {ONLINE}"
+            )
+        # The shadow columns were filled from user_user, checking every row
+        # again would force a table copy.
+        self.execute("SET foreign_key_checks = 0")
+        try:
+            for table, _, column, _ in user_references():
+                constraint = truncate_name(
+                    f"{table}_{column}_fk_{self.user_table}_id", 64
+                )
+                if self.foreign_key_exists(table, constraint):
+                    continue
+                self.execute(
+                    f"ALTER TABLE {self.q(table)} ADD CONSTRAINT {self.q(constraint)} "
+                    f"FOREIGN KEY ({self.q(column)}) "
+                    f"REFERENCES {self.q(self.user_table)} (id), {ONLINE}"
+                )
+        finally:
+            self.execute("SET foreign_key_checks = 1")
+        self.stdout.write(self.style.SUCCESS("Users now have an integer primary key."))
+
+    def foreign_key_exists(self, table, name):
+        return self.execute(
+            "SELECT COUNT(*) FROM information_schema.TABLE_CONSTRAINTS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND CONSTRAINT_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'",
+            [table, name],
+        ).fetchone()[0]
+
+    def swap_column(self, table, column, null):
+        """Replaces the username column by its shadow column, keeping its indexes."""
+
+        for suffix in ("ins", "upd"):
+            trigger = truncate_name(f"{table}_{column}_pk_{suffix}", 64)
+            self.execute(f"DROP TRIGGER IF EXISTS {self.q(trigger)}")
+
+        foreign_keys = self.execute(
+            "SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND COLUMN_NAME = %s AND REFERENCED_TABLE_NAME = %s",
+            [table, column, self.user_table],
+        ).fetchall()
+        indexes = {}
+        for name, unique, index_column in self.execute(
+            "SELECT INDEX_NAME, NON_UNIQUE = 0, COLUMN_NAME "
+            "FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME IN "
+            "(SELECT INDEX_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND COLUMN_NAME = %s) ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+            [table, table, column],
+        ).fetchall():
+            indexes.setdefault((name, unique), []).append(index_column)
+
+        # A single statement, so that a table is either swapped with its
+        # indexes recreated or left untouched.
+        changes = [f"DROP FOREIGN KEY {self.q(name)}" for (name,) in foreign_keys]
+        changes += [f"DROP KEY {self.q(name)}" for name, _ in indexes]
+        changes += [
+            f"DROP COLUMN {self.q(column)}",
+            f"CHANGE COLUMN {self.q(column + SHADOW_SUFFIX)} {self.q(column)} "
+            f"BIGINT {'NULL' if null else 'NOT NULL'}",
+        ]
+        changes += [
+            f"ADD {'UNIQUE ' if unique else ''}KEY {self.q(name)} "
+            f"({', '.join(self.q(c) for c in index_columns)})"
+            for (name, unique), index_columns in indexes.items()
+        ]
+        self.execute(f"ALTER TABLE {self.q(table)} {', '.join(changes)}, {ONLINE}")
+        self.stdout.write(f"Swapped {table}.{column}")
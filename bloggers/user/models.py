@@ -28,7 +28,8 @@ class UserManager(BaseUserManager):
 class User(AbstractBaseUser, PermissionsMixin):
     """User object"""
 
-    username = models.CharField(max_length=255, primary_key=True)
+    id = models.BigAutoField(primary_key=True)
+    username = models.CharField(max_length=255, unique=True)
     email = models.EmailField(max_length=255, unique=True)
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
@@ -42,9 +43,14 @@ class User(AbstractBaseUser, PermissionsMixin):
 class Follow(models.Model):
     """Follow object"""
 
+    # Indexed as the leading column of the (follower, following) index.
     follower = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name="following", db_index=True
+        User, on_delete=models.CASCADE, related_name="following", db_index=False
     )
     following = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="follower", db_index=True
     )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["follower", "following"])]
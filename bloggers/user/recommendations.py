@@ -0,0 +1,119 @@
+"""
+Who-to-follow recommendations from the follow graph.
+"""
+
+import logging
+import math
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from user.models import User, Follow
+from blog.models import Blog
+
+# Candidates scored for recent activity, out of those with the most mutuals.
+CANDIDATES = 200
+# Blogs posted in the last ACTIVITY_DAYS add ACTIVITY_WEIGHT * log2(1 + blogs)
+# to the mutual follow count, so mutual follows dominate the ranking.
+ACTIVITY_DAYS = 30
+ACTIVITY_WEIGHT = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(user_id):
+    return f"recommendations:{user_id}"
+
+
+def recommend(user, limit=20):
+    """Returns up to limit users followed by the users the given user follows,
+    ranked by the number of such mutual follows and by their recent blogs.
+
+    Results are cached per user until they follow or unfollow someone, or for
+    RECOMMENDATIONS_CACHE_TIMEOUT seconds.
+    """
+
+    key = cache_key(user.pk)
+    recommendations = _use_cache(cache.get, key)
+    if recommendations is None:
+        recommendations = compute_recommendations(user)
+        _use_cache(
+            cache.set, key, recommendations, settings.RECOMMENDATIONS_CACHE_TIMEOUT
+        )
+    return recommendations[:limit]
+
+
+def invalidate(user):
+    """Drops the cached recommendations of the user once the transaction commits."""
+
+    key = cache_key(user.pk)
+    transaction.on_commit(lambda: _use_cache(cache.delete, key))
+
+
+def _use_cache(method, *args):
+    """The cache only saves work, when it is unavailable, e.g. before its table
+    is created, the error is logged and the recommendations are computed."""
+
+    try:
+        return method(*args)
+    except Exception:
+        logger.exception("Recommendations cache unavailable")
+        return None
+
+
+def compute_recommendations(user, limit=50):
+    """Scores friends of friends with two aggregated queries.
+
+    Only the RECOMMENDATIONS_MAX_FOLLOWING most recently followed users are
+    walked, which bounds the work for users following very many others.
+    """
+
+    followed = Follow.objects.filter(follower=user)
+    sources = list(
+        followed.order_by("-id").values_list("following", flat=True)[
+            : settings.RECOMMENDATIONS_MAX_FOLLOWING
+        ]
+    )
+    if not sources:
+        return []
+
+    mutuals = dict(
+        Follow.objects.filter(follower__in=sources)
+        .exclude(following=user)
+        .exclude(following__in=followed.values("following"))
+        .values("following")
+        .annotate(mutuals=Count("follower", distinct=True))
+        .order_by("-mutuals", "following")
+        .values_list("following", "mutuals")[:CANDIDATES]
+    )
+
+    since = timezone.now() - timedelta(days=ACTIVITY_DAYS)
+    activity = dict(
+        Blog.objects.filter(author__in=mutuals, created_at__gte=since)
+        .values("author")
+        .annotate(blogs=Count("id"))
+        .order_by()
+        .values_list("author", "blogs")
+    )
+
+    ranked = sorted(
+        mutuals,
+        key=lambda pk: (
+            mutuals[pk] + ACTIVITY_WEIGHT * math.log2(1 + activity.get(pk, 0)),
+            -pk,
+        ),
+        reverse=True,
+    )[:limit]
+    users = User.objects.filter(pk__in=ranked, is_active=True).in_bulk()
+    return [
+        {
+            "username": users[pk].username,
+            "name": users[pk].name,
+            "mutuals": mutuals[pk],
+            "recent_blogs": activity.get(pk, 0),
+        }
+        for pk in ranked
+        if pk in users
+    ]
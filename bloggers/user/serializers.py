@@ -2,9 +2,9 @@
 Serializers for the user API.
 """
 
-
 from rest_framework import serializers
 from user.models import User, Follow
+from blog.models import AuthorDailyStats
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -19,6 +19,8 @@ class FollowSerializer(serializers.ModelSerializer):
 class FollowerSerializer(FollowSerializer):
     """Serializer for the user following"""
 
+    following = serializers.SlugRelatedField(slug_field="username", read_only=True)
+
     class Meta(FollowSerializer.Meta):
         fields = FollowSerializer.Meta.fields + ["following"]
 
@@ -26,6 +28,8 @@ class FollowerSerializer(FollowSerializer):
 class FollowingSerializer(FollowSerializer):
     """Serializer for the user followers"""
 
+    follower = serializers.SlugRelatedField(slug_field="username", read_only=True)
+
     class Meta(FollowSerializer.Meta):
         fields = FollowSerializer.Meta.fields + ["follower"]
 
@@ -53,3 +57,48 @@ class UserDetailsSerializer(UserSerializer):
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ["follower", "following"]
+
+
+class RecommendationSerializer(serializers.Serializer):
+    """Serializer for a recommended user to follow"""
+
+    username = serializers.CharField()
+    name = serializers.CharField()
+    mutuals = serializers.IntegerField()
+    recent_blogs = serializers.IntegerField()
+
+
+class StatsQuerySerializer(serializers.Serializer):
+    """Serializer for the date range of stats, both days included"""
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+
+class DailyStatsSerializer(serializers.ModelSerializer):
+    """Serializer for the stats of an author in a day"""
+
+    class Meta:
+        model = AuthorDailyStats
+        fields = ["day", "likes", "comments", "followers"]
+
+
+class BlogStatsSerializer(serializers.Serializer):
+    """Serializer for the stats of a blog over a date range"""
+
+    blog = serializers.IntegerField()
+    likes = serializers.IntegerField()
+    comments = serializers.IntegerField()
+
+
+class StatsSerializer(serializers.Serializer):
+    """Serializer for the stats of an author over a date range"""
+
+    username = serializers.CharField()
+    start = serializers.DateField()
+    end = serializers.DateField()
+    likes = serializers.IntegerField()
+    comments = serializers.IntegerField()
+    followers = serializers.IntegerField()
+    days = DailyStatsSerializer(many=True)
+    blogs = BlogStatsSerializer(many=True)
@@ -2,18 +2,38 @@
 Tests for user API.
 """
 
-from django.test import TestCase
+import datetime
+import io
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from user.models import User
+from user.models import User, Follow
 from user.serializers import UserDetailsSerializer
+from user.management.commands.convert_user_pk import (
+    ONLINE,
+    SHADOW_SUFFIX,
+    Command,
+    user_references,
+)
+from user.recommendations import recommend
+from blog.models import AuthorDailyStats, Blog, BlogDailyStats
 
 TOKEN_URL = reverse("authenticate")
+REFRESH_TOKEN_URL = reverse("refresh-token")
+VERIFY_TOKEN_URL = reverse("verify-token")
 CREATE_USER_URL = reverse("user:create-user")
 PROFILE_URL = reverse("user:me")
 FOLLOW_URL = lambda username: reverse("user:follow", kwargs={"username": username})
+RECOMMENDATIONS_URL = reverse("user:recommendations")
+STATS_URL = lambda username: reverse("user:stats", kwargs={"username": username})
 UNFOLLOW_URL = lambda username: reverse("user:unfollow", kwargs={"username": username})
 
 
@@ -111,6 +131,99 @@ class UnauthorizedUserTests(TestCase):
         self.assertNotIn("access", res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_jwt_token_refresh_successful(self):
+        """Test refreshing jwt token returns a new access and refresh token"""
+
+        payload = {
+            "email": "user1@example.com",
+            "password": "user1pass",
+            "name": "User1",
+        }
+        user = create_user(**payload)
+        token_payload = {"username": user.username, "password": payload["password"]}
+        tokens = self.client.post(TOKEN_URL, token_payload)
+        res = self.client.post(REFRESH_TOKEN_URL, {"refresh": tokens.data["refresh"]})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("access", res.data)
+        self.assertIn("refresh", res.data)
+        self.assertNotEqual(res.data["refresh"], tokens.data["refresh"])
+
+    def test_jwt_rotated_refresh_token_is_blacklisted(self):
+        """Test reusing a rotated refresh token is not successful"""
+
+        payload = {
+            "email": "user1@example.com",
+            "password": "user1pass",
+            "name": "User1",
+        }
+        user = create_user(**payload)
+        token_payload = {"username": user.username, "password": payload["password"]}
+        tokens = self.client.post(TOKEN_URL, token_payload)
+        self.client.post(REFRESH_TOKEN_URL, {"refresh": tokens.data["refresh"]})
+        res = self.client.post(REFRESH_TOKEN_URL, {"refresh": tokens.data["refresh"]})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_jwt_token_verify(self):
+        """Test verifying valid and invalid jwt tokens"""
+
+        payload = {
+            "email": "user1@example.com",
+            "password": "user1pass",
+            "name": "User1",
+        }
+        user = create_user(**payload)
+        token_payload = {"username": user.username, "password": payload["password"]}
+        tokens = self.client.post(TOKEN_URL, token_payload)
+        res = self.client.post(VERIFY_TOKEN_URL, {"token": tokens.data["access"]})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.post(VERIFY_TOKEN_URL, {"token": "invalid"})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_rehashed_on_login(self):
+        """Test a password stored with an older hasher is upgraded on login"""
+
+        payload = {
+            "email": "user1@example.com",
+            "password": "user1pass",
+            "name": "User1",
+        }
+        with override_settings(
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"]
+        ):
+            user = create_user(**payload)
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+        hashers = [
+            "django.contrib.auth.hashers.ScryptPasswordHasher",
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        ]
+        with override_settings(PASSWORD_HASHERS=hashers):
+            token_payload = {"username": user.username, "password": payload["password"]}
+            res = self.client.post(TOKEN_URL, token_payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("scrypt$"))
+
+    def test_retrieve_user_with_jwt_token_successful(self):
+        """Test retrieving user profile with a jwt token identifying the username"""
+
+        payload = {
+            "email": "user1@example.com",
+            "password": "user1pass",
+            "name": "User1",
+        }
+        user = create_user(**payload)
+        follower = create_user(
+            email="user2@example.com", password="user2pass", name="User2"
+        )
+        Follow.objects.create(follower=follower, following=user)
+        token_payload = {"username": user.username, "password": payload["password"]}
+        tokens = self.client.post(TOKEN_URL, token_payload)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.data['access']}")
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["username"], user.username)
+        self.assertEqual(res.data["follower"][0]["follower"], follower.username)
+
     def test_retrieve_user_unauthorized(self):
         """Test retrieving user profile of unauthorized is not successful"""
 
@@ -170,3 +283,245 @@ class AuthorizedUserTests(TestCase):
             user.follower.username for user in temp_user2.follower.all()
         ]
         self.assertNotIn("user2", user1_following_list)
+
+
+class ConvertUserPkTests(TestCase):
+    """Tests for the user primary key conversion"""
+
+    def test_user_references_found(self):
+        """Test every foreign key to users is converted"""
+
+        references = {(table, column) for table, _, column, _ in user_references()}
+        for reference in [
+            ("blog_blog", "author_id"),
+            ("blog_comment", "user_id"),
+            ("blog_like", "user_id"),
+            ("user_follow", "follower_id"),
+            ("user_follow", "following_id"),
+            ("user_user_groups", "user_id"),
+        ]:
+            self.assertIn(reference, references)
+
+    def test_cutover_online_and_resumable(self):
+        """Test cutover alters tables in place and skips tables already swapped"""
+
+        command = RecordingCutover(swapped={"blog_like"})
+        command.cutover({})
+        alters = [sql for sql in command.sql if sql.startswith("ALTER TABLE")]
+        self.assertTrue(all(sql.endswith(ONLINE) for sql in alters))
+        swaps = [sql for sql in alters if "DROP COLUMN" in sql]
+        self.assertTrue(any(command.q("blog_comment") in sql for sql in swaps))
+        self.assertFalse(any(command.q("blog_like") in sql for sql in swaps))
+        foreign_keys = [
+            i for i, sql in enumerate(command.sql) if "FOREIGN KEY (" in sql
+        ]
+        checks_off = command.sql.index("SET foreign_key_checks = 0")
+        checks_on = command.sql.index("SET foreign_key_checks = 1")
+        self.assertTrue(checks_off < min(foreign_keys) < max(foreign_keys) < checks_on)
+
+
+class RecordingCutover(Command):
+    """convert_user_pk recording its SQL instead of running it on MySQL"""
+
+    def __init__(self, swapped):
+        super().__init__(stdout=io.StringIO())
+        self.user_table = User._meta.db_table
+        self.swapped = swapped
+        self.sql = []
+
+    def execute(self, sql, params=None):
+        self.sql.append(sql)
+        return mock.Mock(fetchone=lambda: (0,), fetchall=lambda: [])
+
+    def columns(self, table):
+        if table in self.swapped:
+            return set()
+        return {
+            column + SHADOW_SUFFIX
+            for t, _, column, _ in user_references()
+            if t == table
+        }
+
+    def primary_key(self, table):
+        return "username"
+
+
+class RecommendationTests(TestCase):
+    """Tests for the who-to-follow recommendations"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.users = {
+            name: create_user(
+                email=f"{name}@example.com", password=f"{name}pass", name=name
+            )
+            for name in ["me", "a", "b", "c", "d"]
+        }
+        for follower, following in [
+            ("me", "a"),
+            ("me", "b"),
+            ("a", "c"),
+            ("a", "d"),
+            ("a", "b"),
+            ("a", "me"),
+            ("b", "c"),
+        ]:
+            Follow.objects.create(
+                follower=self.users[follower], following=self.users[following]
+            )
+        Blog.objects.create(title="Post", desc="Post", author=self.users["d"])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.users["me"])
+
+    def test_friends_of_friends_ranked_by_mutuals(self):
+        """Test users followed by followed users are ranked by mutual follows"""
+
+        res = self.client.get(RECOMMENDATIONS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (user["username"], user["mutuals"], user["recent_blogs"])
+                for user in res.data
+            ],
+            [("c", 2, 0), ("d", 1, 1)],
+        )
+
+    def test_recommendations_cached_until_follow(self):
+        """Test recommendations are cached and invalidated by following someone"""
+
+        self.client.get(RECOMMENDATIONS_URL)
+        # Only the read of the database cache.
+        with self.assertNumQueries(1):
+            recommend(self.users["me"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(FOLLOW_URL("c"))
+        res = self.client.get(RECOMMENDATIONS_URL)
+        self.assertEqual([user["username"] for user in res.data], ["d"])
+
+    def test_unavailable_cache_is_bypassed(self):
+        """Test following and recommendations work while the cache fails"""
+
+        broken = mock.Mock(
+            **{
+                "get.side_effect": DatabaseError,
+                "set.side_effect": DatabaseError,
+                "delete.side_effect": DatabaseError,
+            }
+        )
+        with (
+            mock.patch("user.recommendations.cache", broken),
+            self.assertLogs("user.recommendations", level="ERROR"),
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(FOLLOW_URL("c"))
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            res = self.client.get(RECOMMENDATIONS_URL)
+        self.assertEqual([user["username"] for user in res.data], ["d"])
+        broken.delete.assert_called_once()
+
+    @override_settings(RECOMMENDATIONS_MAX_FOLLOWING=1)
+    def test_large_followings_bounded_to_recent_follows(self):
+        """Test only the most recently followed users are walked"""
+
+        res = self.client.get(RECOMMENDATIONS_URL)
+        self.assertEqual([user["username"] for user in res.data], ["c"])
+
+
+class StatsTests(TestCase):
+    """Tests for the daily engagement rollups and stats endpoint"""
+
+    def setUp(self):
+        self.author = create_user(
+            email="author@example.com", password="authorpass", name="Author"
+        )
+        self.reader = create_user(
+            email="reader@example.com", password="readerpass", name="Reader"
+        )
+        self.blog = Blog.objects.create(title="Post", desc="Post", author=self.author)
+        self.client = APIClient()
+
+    def engage(self):
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(reverse("blog:like", kwargs={"id": self.blog.id}))
+        self.client.post(
+            reverse("blog:comment", kwargs={"id": self.blog.id}), {"text": "Nice"}
+        )
+        self.client.post(FOLLOW_URL(self.author.username))
+        self.client.force_authenticate(user=self.author)
+
+    def rollups(self):
+        return (
+            list(
+                AuthorDailyStats.objects.order_by("author", "day").values_list(
+                    "author", "day", "likes", "comments", "followers"
+                )
+            ),
+            list(
+                BlogDailyStats.objects.order_by("blog", "day").values_list(
+                    "blog", "author", "day", "likes", "comments"
+                )
+            ),
+        )
+
+    def test_stats_read_from_rollups(self):
+        """Test stats count new likes, comments and followers per day"""
+
+        self.engage()
+        res = self.client.get(STATS_URL(self.author.username))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            (res.data["likes"], res.data["comments"], res.data["followers"]),
+            (1, 1, 1),
+        )
+        self.assertEqual(len(res.data["days"]), 1)
+        self.assertEqual(
+            res.data["blogs"], [{"blog": self.blog.id, "likes": 1, "comments": 1}]
+        )
+
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        res = self.client.get(
+            STATS_URL(self.author.username), {"start": yesterday, "end": yesterday}
+        )
+        self.assertEqual(res.data["likes"], 0)
+        self.assertEqual(res.data["days"], [])
+
+    def test_stats_only_shown_to_author(self):
+        """Test the stats of another user are not shown"""
+
+        self.client.force_authenticate(user=self.reader)
+        res = self.client.get(STATS_URL(self.author.username))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        """Test rebuilding the rollups reproduces the incrementally kept ones"""
+
+        self.engage()
+        self.client.force_authenticate(user=self.reader)
+        self.client.delete(reverse("blog:unlike", kwargs={"id": self.blog.id}))
+        other = Blog.objects.create(title="Other", desc="Post", author=self.author)
+        self.client.post(reverse("blog:like", kwargs={"id": other.id}))
+        self.client.force_authenticate(user=self.author)
+        self.client.delete(reverse("blog:blog", kwargs={"id": other.id}))
+        incremental = self.rollups()
+
+        call_command("rebuild_stats", stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+        # One author per transaction.
+        call_command("rebuild_stats", "--batch-size", "1", stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+        res = self.client.get(STATS_URL(self.author.username))
+        self.assertEqual((res.data["likes"], res.data["comments"]), (0, 1))
+
+    def test_rebuild_counts_after_locking_rollups(self):
+        """Test rows are counted in the rebuild transaction, after the rollup locks"""
+
+        self.engage()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("rebuild_stats", stdout=io.StringIO())
+        sql = [query["sql"] for query in queries]
+        begin = next(i for i, query in enumerate(sql) if "SAVEPOINT" in query)
+        lock = next(i for i, query in enumerate(sql) if "blogdailystats" in query)
+        count = next(i for i, query in enumerate(sql) if "COUNT(" in query)
+        self.assertLess(begin, lock)
+        self.assertLess(lock, count)
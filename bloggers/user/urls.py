@@ -10,8 +10,15 @@ app_name = "user"
 urlpatterns = [
     path("", user_view.CreateUserView.as_view(), name="create-user"),
     path("/me", user_view.UserView.as_view(), name="me"),
+    path("/events", user_view.UserEventsView.as_view(), name="events"),
+    path(
+        "/recommendations",
+        user_view.RecommendationsView.as_view(),
+        name="recommendations",
+    ),
     path("/follow/<str:username>", user_view.FollowView().as_view(), name="follow"),
     path(
         "/unfollow/<str:username>", user_view.UnFollowView().as_view(), name="unfollow"
     ),
+    path("/<str:username>/stats", user_view.StatsView.as_view(), name="stats"),
 ]
@@ -2,10 +2,26 @@
 Views for the user object.
 """
 
-from rest_framework import generics, permissions, status, response
+import datetime
+from django.db import transaction
+from django.db.models import Prefetch, Sum, prefetch_related_objects
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema
+from rest_framework import exceptions, generics, permissions, status, response
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from user.serializers import UserSerializer, UserDetailsSerializer, FollowSerializer
+from user.serializers import (
+    UserSerializer,
+    UserDetailsSerializer,
+    FollowSerializer,
+    RecommendationSerializer,
+    StatsQuerySerializer,
+    StatsSerializer,
+)
 from user.models import User, Follow
+from user.recommendations import invalidate, recommend
+from blog import stats
+from blog.models import AuthorDailyStats, BlogDailyStats
+from bloggers.events import EventStreamView
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -22,7 +38,13 @@ class UserView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        user = self.request.user
+        prefetch_related_objects(
+            [user],
+            Prefetch("follower", queryset=Follow.objects.select_related("follower")),
+            Prefetch("following", queryset=Follow.objects.select_related("following")),
+        )
+        return user
 
 
 class FollowView(generics.CreateAPIView):
@@ -32,14 +54,19 @@ class FollowView(generics.CreateAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     queryset = User.objects.all()
-    lookup_url_kwarg = "username"
+    lookup_field = "username"
 
     def post(self, request, *args, **kwargs):
         already_following = Follow.objects.filter(
             follower=request.user, following=self.get_object()
         ).exists()
         if not already_following:
-            Follow.objects.create(follower=request.user, following=self.get_object())
+            with transaction.atomic():
+                follow = Follow.objects.create(
+                    follower=request.user, following=self.get_object()
+                )
+                stats.record_follow(follow)
+            invalidate(request.user)
         return response.Response(status=status.HTTP_201_CREATED)
 
 
@@ -50,10 +77,83 @@ class UnFollowView(generics.DestroyAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     queryset = User.objects.all()
-    lookup_url_kwarg = "username"
+    lookup_field = "username"
 
     def delete(self, request, *args, **kwargs):
-        Follow.objects.filter(
-            follower=request.user, following=self.get_object()
-        ).delete()
+        with transaction.atomic():
+            follow = Follow.objects.filter(
+                follower=request.user, following=self.get_object()
+            ).first()
+            if follow is not None:
+                follow.delete()
+                stats.record_follow(follow, delta=-1)
+                invalidate(request.user)
         return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RecommendationsView(generics.ListAPIView):
+    """Retrieve users to follow, followed by the users the current user follows"""
+
+    serializer_class = RecommendationSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        recommendations = recommend(request.user)
+        return response.Response(self.get_serializer(recommendations, many=True).data)
+
+
+class StatsView(generics.GenericAPIView):
+    """Retrieve the daily likes, comments and followers of the current user,
+    read from the rollups only"""
+
+    serializer_class = StatsSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(parameters=[StatsQuerySerializer], responses=StatsSerializer)
+    def get(self, request, *args, **kwargs):
+        if kwargs["username"] != request.user.username:
+            raise exceptions.PermissionDenied("Stats are only shown to their author.")
+        params = StatsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        end = params.validated_data.get("end") or timezone.localdate()
+        start = params.validated_data.get("start") or end - datetime.timedelta(days=29)
+        if not start <= end <= start + datetime.timedelta(days=365):
+            raise exceptions.ValidationError(
+                {"end": ["Must be on or after start and within a year of it."]}
+            )
+
+        days = list(
+            AuthorDailyStats.objects.filter(
+                author=request.user, day__range=(start, end)
+            ).order_by("day")
+        )
+        blogs = (
+            BlogDailyStats.objects.filter(author=request.user, day__range=(start, end))
+            .values("blog")
+            .annotate(likes=Sum("likes"), comments=Sum("comments"))
+            .order_by("-likes", "-comments", "blog")
+        )
+        totals = {
+            name: sum(getattr(day, name) for day in days)
+            for name in ("likes", "comments", "followers")
+        }
+        serializer = self.get_serializer(
+            {
+                "username": request.user.username,
+                "start": start,
+                "end": end,
+                **totals,
+                "days": days,
+                "blogs": blogs,
+            }
+        )
+        return response.Response(serializer.data)
+
+
+class UserEventsView(EventStreamView):
+    """Stream the new likes and comments of the blogs of the current user"""
+
+    async def get_channels(self, request, user):
+        return [f"user:{user.pk}"]